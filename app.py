@@ -1,19 +1,30 @@
-from flask import Flask, render_template, jsonify, request, redirect, url_for
-import pandas as pd
+from flask import Flask, Blueprint, current_app, render_template, jsonify, request, redirect, url_for, g, stream_with_context
 import tempfile
+import atexit
+import csv
+import io
+from concurrent.futures import ThreadPoolExecutor
 import os
 import sys
 from werkzeug.utils import secure_filename
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import select, insert, update, bindparam, func, case, or_, event
+from sqlalchemy.orm import Session
+from response_cache import ResponseCache, conditional
+from change_feed import ChangeFeed
+from write_queue import GroupCommitQueue
+from donor_queries import donors_per_project
+from geo_aggregation import AREA_LEVELS, seed_county_mapping, donors_per_area
+from app_config import get_config
 from datetime import datetime, timedelta
+from functools import lru_cache
 import random
 import secrets
 import hashlib
+import itertools
+import math
 import json
 import logging
-import folium
-import sqlite3
-import json
 
 # Configure logging
 logging.basicConfig(
@@ -25,83 +36,163 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 logger.info('Starting application initialization')
 
-# Log system information
-logger.info(f'Python version: {sys.version}')
-logger.info(f'Platform: {sys.platform}')
-logger.info(f'Current working directory: {os.getcwd()}')
-logger.info(f'Environment variables: {[k for k in os.environ.keys()]}')
+db = SQLAlchemy()
 
-app = Flask(__name__, instance_relative_config=True, static_folder='static', static_url_path='/static')
+# The routes are grouped in blueprints, which create_app() registers on the application
+dashboard = Blueprint('dashboard', __name__)
+imports = Blueprint('imports', __name__)
+api = Blueprint('api', __name__)
 
-# Make sure the instance folder exists
-try:
-    os.makedirs(app.instance_path, exist_ok=True)
-    logger.info(f'Instance path created: {app.instance_path}')
-    # Check if the instance directory is writable
-    test_file_path = os.path.join(app.instance_path, 'test_write.txt')
-    try:
-        with open(test_file_path, 'w') as f:
-            f.write('test')
-        os.remove(test_file_path)
-        logger.info('Instance directory is writable')
-    except Exception as e:
-        logger.error(f'Instance directory is not writable: {e}')
-except Exception as e:
-    logger.error(f'Error creating instance path: {e}')
-
-# Database configuration
-logger.info('Configuring database connection')
-# Check for environment variables first (for Azure deployment)
-db_uri = os.environ.get('DATABASE_URL')
-if not db_uri:
-    db_path = os.path.join(app.instance_path, 'donors.db')
-    db_uri = f'sqlite:///{db_path}'
-    logger.info(f'Using SQLite database at: {db_path}')
-    # Check if the database directory is writable
-    db_dir = os.path.dirname(db_path)
-    logger.info(f'Database directory: {db_dir}')
-    if os.path.exists(db_dir):
-        logger.info(f'Database directory exists: {db_dir}')
-        if os.access(db_dir, os.W_OK):
-            logger.info(f'Database directory is writable: {db_dir}')
-        else:
-            logger.error(f'Database directory is not writable: {db_dir}')
-    else:
-        logger.error(f'Database directory does not exist: {db_dir}')
-else:
-    # Log the type of database being used (without exposing credentials)
-    db_type = db_uri.split('://')[0] if '://' in db_uri else 'unknown'
-    logger.info(f'Using database from environment variable: {db_type}')
-
-app.config['SQLALCHEMY_DATABASE_URI'] = db_uri
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-logger.info('Database configuration complete')
-app.config['TEMPLATES_AUTO_RELOAD'] = True
-
-# Log startup information
-app.logger.info('Starting KB FG Monitor application')
-app.logger.info(f'Current directory: {os.getcwd()}')
-
-try:
-    app.logger.info(f'Files in current directory: {os.listdir(".")}')
-    if os.path.exists("instance"):
-        app.logger.info(f'Files in instance directory: {os.listdir("instance")}')
+def configure_database(app):
+    """Configure the primary database, and the optional read database, from the environment"""
+    logger.info('Configuring database connection')
+    # Check for environment variables first (for Azure deployment)
+    db_uri = os.environ.get('DATABASE_URL')
+    if not db_uri:
+        db_path = os.path.join(app.instance_path, 'donors.db')
+        db_uri = f'sqlite:///{db_path}'
+        logger.info(f'Using SQLite database at: {db_path}')
     else:
-        app.logger.info("No instance directory found")
-except Exception as e:
-    app.logger.error(f'Error listing directory contents: {e}')
+        # Log the type of database being used (without exposing credentials)
+        db_type = db_uri.split('://')[0] if '://' in db_uri else 'unknown'
+        logger.info(f'Using database from environment variable: {db_type}')
+    
+    app.config['SQLALCHEMY_DATABASE_URI'] = db_uri
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # SQLite pragmas of the environment (FLASK_ENV), see app_config.py
+    app.config['SQLITE_PRAGMAS'] = get_config().SQLITE_PRAGMAS
+    
+    # Optional read-only replica, or SQLite snapshot file, for the heavy dashboard reads
+    read_db_uri = os.environ.get('DATABASE_READ_URL')
+    if read_db_uri:
+        app.config['SQLALCHEMY_BINDS'] = {'read': read_db_uri}
+        read_db_type = read_db_uri.split('://')[0] if '://' in read_db_uri else 'unknown'
+        logger.info(f'Routing dashboard reads to the {read_db_type} database from DATABASE_READ_URL')
+    logger.info('Database configuration complete')
+
+# Static files are linked with a content fingerprint (?v=...), so they can be cached for a year
+STATIC_MAX_AGE = 365 * 24 * 3600
+
+@lru_cache(maxsize=None)
+def static_fingerprint(static_folder, filename):
+    """Short hash of the content of a static file, None if the file doesn't exist"""
+    path = os.path.join(static_folder, filename)
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.md5(f.read()).hexdigest()[:12]
+    except OSError:
+        return None
+
+def add_static_fingerprint(endpoint, values):
+    if endpoint == 'static' and 'v' not in values:
+        fingerprint = static_fingerprint(current_app.static_folder, values.get('filename', ''))
+        if fingerprint:
+            values['v'] = fingerprint
 
-# Disable caching
-@app.after_request
 def add_header(response):
-    response.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, post-check=0, pre-check=0, max-age=0'
-    response.headers['Pragma'] = 'no-cache'
-    response.headers['Expires'] = '-1'
+    if request.endpoint == 'static' and request.args.get('v'):
+        response.cache_control.public = True
+        response.cache_control.max_age = STATIC_MAX_AGE
+        response.cache_control.immutable = True
+        response.cache_control.no_cache = None
+        return response
+    # Disable caching of responses that don't set their own caching policy
+    if 'Cache-Control' not in response.headers:
+        response.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, post-check=0, pre-check=0, max-age=0'
+        response.headers['Pragma'] = 'no-cache'
+        response.headers['Expires'] = '-1'
     return response
 
-template_dir = os.path.abspath('templates')
-app.template_folder = template_dir
-db = SQLAlchemy(app)
+def sqlite_pragma_listener(pragmas):
+    """Return an engine connect listener applying the given pragmas to new SQLite connections"""
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+    return set_sqlite_pragmas
+
+def read_connection():
+    """
+    Return what the heavy dashboard reads execute their queries on: a connection to the
+    'read' bind if DATABASE_READ_URL is set, else the session of the primary database.
+    The connection is kept for the rest of the request.
+    """
+    if 'read' not in db.engines:
+        return db.session
+    if 'read_connection' not in g:
+        g.read_connection = db.engines['read'].connect()
+    return g.read_connection
+
+def close_read_connection(exception):
+    connection = g.pop('read_connection', None)
+    if connection is not None:
+        connection.close()
+
+def read_data_version(connection):
+    """Read the (version, updated_at) of the data on a connection or session"""
+    row = connection.execute(
+        select(DataVersion.version, DataVersion.updated_at).where(DataVersion.id == 1)
+    ).first()
+    return (row.version, row.updated_at) if row else (0, datetime(2025, 1, 1))
+
+def get_data_version():
+    """
+    Return the (version, updated_at) of the dashboard data. Read once per request, as it
+    is used both to key cached responses and as the ETag of conditional requests.
+    It is read from the same database as the dashboards, so a lagging replica keeps
+    serving the version its data belongs to.
+    """
+    if 'data_version' not in g:
+        g.data_version = read_data_version(read_connection())
+    return g.data_version
+
+def get_primary_data_version():
+    """
+    Return the (version, updated_at) of the primary database, for the routes that read
+    the primary instead of the read database. The same as get_data_version() without one.
+    """
+    if 'read' not in db.engines:
+        return get_data_version()
+    if 'primary_data_version' not in g:
+        g.primary_data_version = read_data_version(db.session)
+    return g.primary_data_version
+
+def bump_data_version():
+    """Increase the data version, so every worker treats its cached responses as stale"""
+    now = datetime.utcnow()
+    table = DataVersion.__table__
+    with db.engine.begin() as conn:
+        result = conn.execute(
+            update(table).where(table.c.id == 1).values(version=table.c.version + 1, updated_at=now)
+        )
+        if result.rowcount == 0:
+            conn.execute(insert(table).values(id=1, version=1, updated_at=now))
+    g.pop('data_version', None)
+    g.pop('primary_data_version', None)
+
+# The time to live is set from RESPONSE_CACHE_TTL by create_app()
+response_cache = ResponseCache(60, get_data_version)
+# Aggregates shared by several views, keyed by data version so they can be kept for an hour
+aggregate_cache = ResponseCache(3600)
+conditional_get = conditional(get_data_version)
+# The same for the routes that read the primary database, keyed by its data version
+primary_response_cache = ResponseCache(60, get_primary_data_version)
+primary_conditional_get = conditional(get_primary_data_version)
+
+def invalidate_dashboard_cache():
+    """Drop the cached dashboard responses after donors or donor statistics changed"""
+    bump_data_version()
+    response_cache.clear()
+    primary_response_cache.clear()
+    aggregate_cache.clear()
+    change_feed.notify()
+
+class DataVersion(db.Model):
+    """Single row counting the changes to donors and donor statistics"""
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
 
 class DonorStats(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -111,6 +202,31 @@ class DonorStats(db.Model):
     n_total_new_donors = db.Column(db.Integer, nullable=False)
     yearly_sum_all_donors = db.Column(db.Float, nullable=False)
 
+    @classmethod
+    def update_or_create(cls, date, n_new_donors, yearly_sum_new_donors, n_total_new_donors, yearly_sum_all_donors,
+                         commit=True):
+        """
+        Update existing record or create new one if date doesn't exist
+        """
+        record = cls.query.filter_by(date=date).first()
+        if record:
+            record.n_new_donors = n_new_donors
+            record.yearly_sum_new_donors = yearly_sum_new_donors
+            record.n_total_new_donors = n_total_new_donors
+            record.yearly_sum_all_donors = yearly_sum_all_donors
+        else:
+            record = cls(
+                date=date,
+                n_new_donors=n_new_donors,
+                yearly_sum_new_donors=yearly_sum_new_donors,
+                n_total_new_donors=n_total_new_donors,
+                yearly_sum_all_donors=yearly_sum_all_donors
+            )
+            db.session.add(record)
+        if commit:
+            db.session.commit()
+        return record
+
 class RecurringDonor(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -162,8 +278,17 @@ class RecurringDonor(db.Model):
     campaign_id = db.Column(db.Integer, nullable=True)
     classification_id_success = db.Column(db.String(10), nullable=True)
     
-    # No unique constraint needed
-    # __table_args__ = (db.UniqueConstraint('name_id', name='unique_name'),)
+    # Normalized start date, derived from startdate or startdato on every insert and update
+    start_date = db.Column(db.Date, nullable=True, index=True)
+    
+    # Indexes for the hot lookups besides start_date: the unique import identity of the Excel
+    # upsert, which also serves the lookups by name_id alone, and prosjektnavn (with belop)
+    # and fylke, so /region and /kart group from the index.
+    __table_args__ = (
+        db.Index('uq_recurring_donor_import_key', 'name_id', 'agreement_number', unique=True),
+        db.Index('ix_recurring_donor_prosjektnavn', 'prosjektnavn', 'belop'),
+        db.Index('ix_recurring_donor_fylke', 'fylke'),
+    )
     
     def to_dict(self):
         # First include the original fields for backward compatibility
@@ -229,51 +354,302 @@ class RecurringDonor(db.Model):
         
         return result
 
-    @classmethod
-    def update_or_create(cls, date, n_new_donors, yearly_sum_new_donors, n_total_new_donors, yearly_sum_all_donors):
-        """
-        Update existing record or create new one if date doesn't exist
-        """
-        record = cls.query.filter_by(date=date).first()
-        if record:
-            record.n_new_donors = n_new_donors
-            record.yearly_sum_new_donors = yearly_sum_new_donors
-            record.n_total_new_donors = n_total_new_donors
-            record.yearly_sum_all_donors = yearly_sum_all_donors
+def resolve_start_date(startdate, startdato):
+    """
+    Return the start date of a donor as a date object, preferring the startdate column
+    and falling back to parsing the startdato string (DD.MM.YYYY or YYYY-MM-DD).
+    Returns None if neither holds a valid date.
+    """
+    if startdate:
+        return startdate.date() if isinstance(startdate, datetime) else startdate
+    if not startdato:
+        return None
+    # Only the date part is used, so '2025-05-01 00:00:00' from pandas also parses
+    for date_format in ('%d.%m.%Y', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(startdato.strip()[:10], date_format).date()
+        except ValueError:
+            continue
+    return None
+
+@event.listens_for(RecurringDonor, 'before_insert')
+@event.listens_for(RecurringDonor, 'before_update')
+def set_start_date(mapper, connection, target):
+    """Keep the normalized start_date column in sync with startdate and startdato"""
+    target.start_date = resolve_start_date(target.startdate, target.startdato)
+
+MI_FG_PRODUCT_TYPES = ['MI', 'FG']
+
+def is_mi_fg_donor():
+    """SQL condition matching MI/FG donors on either the Excel or the legacy product type"""
+    return or_(RecurringDonor.produkttype.in_(MI_FG_PRODUCT_TYPES),
+               RecurringDonor.producttype_id.in_(MI_FG_PRODUCT_TYPES))
+
+class DonorDailyRollup(db.Model):
+    """
+    Donor counts and amount sums per start day, product type and payment method,
+    derived from RecurringDonor and kept up to date on every insert, update and delete.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    date = db.Column(db.Date, nullable=True)
+    producttype_id = db.Column(db.String(10), nullable=True)
+    payment_method = db.Column(db.String(50), nullable=True)
+    mi_fg = db.Column(db.Boolean, nullable=False, default=False)
+    n_donors = db.Column(db.Integer, nullable=False, default=0)
+    amount = db.Column(db.Float, nullable=False, default=0)
+    # The key columns above as one string (see rollup_key_string). They can be NULL, which
+    # unique indexes don't compare as equal, so this column is the unique key of the upserts.
+    rollup_key = db.Column(db.String(255), nullable=False)
+    
+    __table_args__ = (
+        db.Index('ix_donor_daily_rollup_key', 'date', 'producttype_id', 'payment_method', 'mi_fg'),
+        db.Index('uq_donor_daily_rollup_rollup_key', 'rollup_key', unique=True),
+    )
+
+def donor_rollup_key(start_date, producttype_id, produkttype, payment_method):
+    """Return the DonorDailyRollup key a donor with the given values is counted under"""
+    mi_fg = produkttype in MI_FG_PRODUCT_TYPES or producttype_id in MI_FG_PRODUCT_TYPES
+    return (start_date, producttype_id, payment_method, mi_fg)
+
+def add_rollup_delta(deltas, key, n_donors, amount):
+    """Accumulate a count and amount change for a rollup key in a deltas dictionary"""
+    current = deltas.get(key, (0, 0))
+    deltas[key] = (current[0] + n_donors, current[1] + (amount or 0))
+
+def rollup_key_string(key):
+    """Encode a rollup key as the string stored in DonorDailyRollup.rollup_key, NULLs included"""
+    date, producttype_id, payment_method, mi_fg = key
+    return json.dumps([date.isoformat() if date else None,
+                       str(producttype_id) if producttype_id is not None else None,
+                       str(payment_method) if payment_method is not None else None,
+                       bool(mi_fg)], ensure_ascii=False)
+
+def rollup_rows(deltas):
+    """The DonorDailyRollup rows of a deltas dictionary, leaving out keys without a change"""
+    return [{'rollup_key': rollup_key_string(key),
+             'date': key[0],
+             'producttype_id': key[1],
+             'payment_method': key[2],
+             'mi_fg': bool(key[3]),
+             'n_donors': n_donors,
+             'amount': amount}
+            for key, (n_donors, amount) in deltas.items() if n_donors or amount]
+
+def apply_rollup_deltas(connection, deltas):
+    """
+    Apply accumulated count and amount changes to DonorDailyRollup on the given connection,
+    so they are committed in the same transaction as the donor changes they come from.
+
+    On SQLite and PostgreSQL all changes are one executemany INSERT ... ON CONFLICT DO UPDATE
+    on the unique rollup_key. Other databases update the existing keys with one executemany
+    and insert the missing ones with another; a key another transaction inserted meanwhile
+    then violates the unique index instead of being counted twice.
+    """
+    table = DonorDailyRollup.__table__
+    rows = rollup_rows(deltas)
+    if not rows:
+        return
+    
+    dialect = connection.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
         else:
-            record = cls(
-                date=date,
-                n_new_donors=n_new_donors,
-                yearly_sum_new_donors=yearly_sum_new_donors,
-                n_total_new_donors=n_total_new_donors,
-                yearly_sum_all_donors=yearly_sum_all_donors
-            )
-            db.session.add(record)
-        db.session.commit()
-        return record
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        statement = dialect_insert(table)
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.rollup_key],
+            set_={'n_donors': table.c.n_donors + statement.excluded.n_donors,
+                  'amount': table.c.amount + statement.excluded.amount}
+        )
+        connection.execute(statement, rows)
+        return
+    
+    keys = [row['rollup_key'] for row in rows]
+    existing = set()
+    for start in range(0, len(keys), 500):
+        existing.update(connection.execute(
+            select(table.c.rollup_key).where(table.c.rollup_key.in_(keys[start:start + 500]))
+        ).scalars())
+    
+    updates = [{'row_key': row['rollup_key'], 'row_n_donors': row['n_donors'], 'row_amount': row['amount']}
+               for row in rows if row['rollup_key'] in existing]
+    if updates:
+        connection.execute(
+            update(table)
+            .where(table.c.rollup_key == bindparam('row_key'))
+            .values(n_donors=table.c.n_donors + bindparam('row_n_donors'),
+                    amount=table.c.amount + bindparam('row_amount')),
+            updates
+        )
+    inserts = [row for row in rows if row['rollup_key'] not in existing]
+    if inserts:
+        connection.execute(insert(table), inserts)
+
+def _stored_donor_rollup(connection, donor_id):
+    """Read the rollup key and amount of a donor as currently stored in the database"""
+    table = RecurringDonor.__table__
+    row = connection.execute(
+        select(table.c.start_date, table.c.producttype_id, table.c.produkttype,
+               table.c.payment_method, table.c.amount)
+        .where(table.c.id == donor_id)
+    ).one_or_none()
+    if row is None:
+        return None, 0
+    return donor_rollup_key(row.start_date, row.producttype_id, row.produkttype, row.payment_method), row.amount
+
+@event.listens_for(RecurringDonor, 'after_insert')
+def rollup_inserted_donor(mapper, connection, target):
+    deltas = {}
+    key = donor_rollup_key(target.start_date, target.producttype_id, target.produkttype, target.payment_method)
+    add_rollup_delta(deltas, key, 1, target.amount)
+    apply_rollup_deltas(connection, deltas)
+
+@event.listens_for(RecurringDonor, 'before_update')
+def rollup_updated_donor(mapper, connection, target):
+    # Read the old values from the database, as attribute history is not
+    # available for attributes that were expired before they were changed
+    old_key, old_amount = _stored_donor_rollup(connection, target.id)
+    if old_key is None:
+        return
+    
+    deltas = {}
+    add_rollup_delta(deltas, old_key, -1, -(old_amount or 0))
+    key = donor_rollup_key(resolve_start_date(target.startdate, target.startdato),
+                           target.producttype_id, target.produkttype, target.payment_method)
+    add_rollup_delta(deltas, key, 1, target.amount)
+    apply_rollup_deltas(connection, deltas)
+
+@event.listens_for(RecurringDonor, 'before_delete')
+def rollup_deleted_donor(mapper, connection, target):
+    old_key, old_amount = _stored_donor_rollup(connection, target.id)
+    if old_key is None:
+        return
+    apply_rollup_deltas(connection, {old_key: (-1, -(old_amount or 0))})
+
+@event.listens_for(Session, 'after_flush')
+def track_dashboard_changes(session, flush_context):
+    """Note on the session that donors or donor statistics changed in this transaction"""
+    if any(isinstance(obj, (RecurringDonor, DonorStats))
+           for obj in itertools.chain(session.new, session.dirty, session.deleted)):
+        session.info['dashboard_data_changed'] = True
+
+@event.listens_for(Session, 'do_orm_execute')
+def track_dashboard_bulk_changes(orm_execute_state):
+    """The same for bulk statements such as Query.delete(), which don't flush objects"""
+    if (orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert) \
+            and orm_execute_state.bind_mapper in (RecurringDonor.__mapper__, DonorStats.__mapper__):
+        orm_execute_state.session.info['dashboard_data_changed'] = True
+
+@event.listens_for(Session, 'after_commit')
+def invalidate_after_commit(session):
+    """
+    Bump the data version once donors or donor statistics changed were committed, from
+    any code path (routes, imports, the scripts), so ETags and cached responses change.
+    Statements that bypass the ORM set session.info['dashboard_data_changed'] themselves,
+    see write_donor_batch().
+    """
+    if session.info.pop('dashboard_data_changed', False):
+        invalidate_dashboard_cache()
+
+@event.listens_for(Session, 'after_rollback')
+def forget_dashboard_changes(session):
+    session.info.pop('dashboard_data_changed', None)
+
+def rebuild_donor_rollup():
+    """
+    Recompute DonorDailyRollup from scratch from the recurring_donor table.
+    Needed after bulk statements that bypass the ORM events, such as Query.delete().
+    Returns the number of rollup rows written.
+    """
+    table = DonorDailyRollup.__table__
+    mi_fg = case((is_mi_fg_donor(), True), else_=False)
+    grouped = (
+        select(RecurringDonor.start_date,
+               RecurringDonor.producttype_id,
+               RecurringDonor.payment_method,
+               mi_fg,
+               func.count(),
+               func.coalesce(func.sum(RecurringDonor.amount), 0))
+        .group_by(RecurringDonor.start_date,
+                  RecurringDonor.producttype_id,
+                  RecurringDonor.payment_method,
+                  mi_fg)
+    )
+    # The rollup_key is computed in Python, so the grouped rows are read and written back
+    totals = {}
+    for start_date, producttype_id, payment_method, is_mi_fg, n_donors, amount in db.session.execute(grouped):
+        add_rollup_delta(totals, (start_date, producttype_id, payment_method, bool(is_mi_fg)), n_donors, amount)
+    db.session.execute(table.delete())
+    rows = rollup_rows(totals)
+    if rows:
+        db.session.execute(insert(table), rows)
+    db.session.commit()
+    invalidate_dashboard_cache()
+    return db.session.query(DonorDailyRollup).count()
+
+class CountyMapping(db.Model):
+    """Maps a fylke name in the donor data to the current county it belongs to"""
+    fylke = db.Column(db.String(255), primary_key=True)
+    county = db.Column(db.String(255), nullable=False)
+
+class ImportJob(db.Model):
+    """Progress and result of an Excel import running in the background"""
+    id = db.Column(db.String(32), primary_key=True)
+    filename = db.Column(db.String(255), nullable=True)
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    rows_total = db.Column(db.Integer, nullable=False, default=0)
+    rows_processed = db.Column(db.Integer, nullable=False, default=0)
+    rows_written = db.Column(db.Integer, nullable=False, default=0)
+    added = db.Column(db.Integer, nullable=False, default=0)
+    updated = db.Column(db.Integer, nullable=False, default=0)
+    skipped = db.Column(db.Integer, nullable=False, default=0)
+    errors = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    
+    def to_dict(self):
+        # Throughput in spreadsheet rows per second since the job started
+        throughput = None
+        if self.started_at:
+            elapsed = ((self.finished_at or datetime.utcnow()) - self.started_at).total_seconds()
+            throughput = round(self.rows_processed / elapsed, 1) if elapsed > 0 else None
+        
+        return {
+            'id': self.id,
+            'filename': self.filename,
+            'status': self.status,
+            'rows_total': self.rows_total,
+            'rows_processed': self.rows_processed,
+            'rows_written': self.rows_written,
+            'added': self.added,
+            'updated': self.updated,
+            'skipped': self.skipped,
+            'rows_per_second': throughput,
+            'errors': json.loads(self.errors) if self.errors else [],
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+# Excel imports run one at a time on a background thread, so requests return immediately
+import_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='excel-import')
 
 # API key for vendor authentication - in production, store this securely
 # Generate a random API key for initial setup
 API_KEY = os.environ.get('VENDOR_API_KEY', 'test_api_key_123')
 
-@app.route('/')
+@dashboard.route('/')
 def index():
     return render_template('report-5.html')
 
-@app.route('/region')
+@dashboard.route('/region')
+@conditional_get
+@response_cache.cached
 def region():
     # Get donor counts by project name (prosjektnavn)
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT prosjektnavn, COUNT(*) as count, SUM(belop) as total_amount 
-        FROM recurring_donor 
-        WHERE prosjektnavn IS NOT NULL AND prosjektnavn != '' 
-        GROUP BY prosjektnavn 
-        ORDER BY count DESC
-    """)
-    project_data = cursor.fetchall()
-    conn.close()
+    project_data = donors_per_project(read_connection(), RecurringDonor.__table__)
     
     # Process the project data
     processed_data = []
@@ -310,80 +686,48 @@ def region():
                            total_amount=total_amount,
                            total_yearly_amount=total_amount * 12)
 
-@app.route('/kart')
+@dashboard.route('/kart')
+@conditional_get
+@response_cache.cached
 def kart():
-    # Get donor counts by fylke
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT fylke, COUNT(*) as count 
-        FROM recurring_donor 
-        WHERE fylke IS NOT NULL AND fylke != '' 
-        GROUP BY fylke 
-        ORDER BY count DESC
-    """)
-    fylke_data = cursor.fetchall()
-    conn.close()
-    
-    # Define mapping for fylke names to match current Norwegian counties (2024)
-    fylke_mapping = {
-        'Oslo': 'Oslo',
-        'Rogaland': 'Rogaland',
-        'Møre og Romsdal': 'Møre og Romsdal',
-        'Nordland': 'Nordland',
-        'Trøndelag': 'Trøndelag',
-        'Troms og Finnmark': 'Troms og Finnmark',
-        'Vestland': 'Vestland',
-        'Agder': 'Agder',
-        'Innlandet': 'Innlandet',
-        'Vestfold og Telemark': 'Vestfold og Telemark',
-        'Viken': 'Viken',
-        # Map old county names to new ones
-        'Akershus': 'Viken',
-        'Buskerud': 'Viken',
-        'Østfold': 'Viken',
-        'Vestfold': 'Vestfold og Telemark',
-        'Telemark': 'Vestfold og Telemark',
-        'Oppland': 'Innlandet',
-        'Hedmark': 'Innlandet',
-        'Aust-Agder': 'Agder',
-        'Vest-Agder': 'Agder',
-        'Hordaland': 'Vestland',
-        'Sogn og Fjordane': 'Vestland',
-        'Troms': 'Troms og Finnmark',
-        'Finnmark': 'Troms og Finnmark'
-    }
-    
-    # Convert data to a format suitable for display, mapping fylke names
-    consolidated_fylke_data = {}
-    for row in fylke_data:
-        fylke_name = row[0]
-        count = row[1]
-        # Map to current county name if available
-        if fylke_name in fylke_mapping:
-            mapped_name = fylke_mapping[fylke_name]
-            if mapped_name in consolidated_fylke_data:
-                consolidated_fylke_data[mapped_name] += count
-            else:
-                consolidated_fylke_data[mapped_name] = count
-        else:
-            # Keep original name if no mapping exists
-            consolidated_fylke_data[fylke_name] = count
-    
-    # Convert the consolidated data back to a list of tuples for display
-    consolidated_fylke_list = [(fylke, count) for fylke, count in consolidated_fylke_data.items()]
-    consolidated_fylke_list.sort(key=lambda x: x[1], reverse=True)  # Sort by count in descending order
+    # Donor counts per current county, old county names mapped in SQL
+    consolidated_fylke_list = donor_area_counts('fylke')
     
     # Create a bar chart for top 5 fylker
     top_fylker = consolidated_fylke_list[:5]
     
     return render_template('kart.html', fylke_data=consolidated_fylke_list, top_fylker=top_fylker)
 
-@app.route('/import')
+@api.route('/api/donors-by-area')
+@conditional_get
+@response_cache.cached
+def get_donors_by_area():
+    """Donor counts per area, ?level=fylke (default, mapped to current counties), kommune or postnummer"""
+    level = request.args.get('level', 'fylke')
+    if level not in AREA_LEVELS:
+        return jsonify({'error': f'level must be one of: {", ".join(AREA_LEVELS)}'}), 400
+    
+    areas = donor_area_counts(level)
+    return jsonify({
+        'level': level,
+        'total': sum(count for _, count in areas),
+        'areas': [{'name': name, 'count': count} for name, count in areas]
+    })
+
+def donor_area_counts(level):
+    """Donor counts per area, computed once per data version and level"""
+    key = (get_data_version()[0], level)
+    areas = aggregate_cache.get(key)
+    if areas is None:
+        areas = donors_per_area(read_connection(), RecurringDonor.__table__, CountyMapping.__table__, level)
+        aggregate_cache.set(key, areas)
+    return areas
+
+@imports.route('/import')
 def import_page():
     return render_template('import.html')
 
-@app.route('/import-excel', methods=['POST'])
+@imports.route('/import-excel', methods=['POST'])
 def import_excel():
     if 'file' not in request.files:
         return jsonify({
@@ -406,339 +750,438 @@ def import_excel():
             'message': 'File must be an Excel file (.xlsx or .xls)'
         })
     
-    # Save the file to a temporary location
-    temp_dir = tempfile.gettempdir()
-    filename = secure_filename(file.filename)
-    filepath = os.path.join(temp_dir, filename)
+    # Save the file to a temporary location, prefixed with the job id so uploads don't collide
+    job = ImportJob(id=secrets.token_hex(16), filename=secure_filename(file.filename), status='queued')
+    filepath = os.path.join(tempfile.gettempdir(), f'{job.id}_{job.filename}')
     file.save(filepath)
     
-    # Process the Excel file
-    try:
-        results = process_excel_file(filepath)
-        
-        # Delete the temporary file
-        os.remove(filepath)
+    db.session.add(job)
+    db.session.commit()
+    
+    # Process the Excel file in the background and let the page poll the job
+    import_executor.submit(run_import_job, current_app._get_current_object(), job.id, filepath)
+    
+    return jsonify({
+        'success': True,
+        'message': 'Import started',
+        'job_id': job.id,
+        'status_url': url_for('imports.get_import_job', job_id=job.id)
+    }), 202
+
+@imports.route('/api/import-jobs/<job_id>')
+def get_import_job(job_id):
+    job = db.session.get(ImportJob, job_id)
+    if not job:
+        return jsonify({'error': 'Import job not found'}), 404
+    return jsonify(job.to_dict())
+
+def run_import_job(app, job_id, filepath):
+    """Run an Excel import on the import worker thread, recording its progress on the ImportJob"""
+    with app.app_context():
+        job = db.session.get(ImportJob, job_id)
+        job.status = 'running'
+        job.started_at = datetime.utcnow()
+        db.session.commit()
         
-        return jsonify({
-            'success': True,
-            'message': f'Import completed successfully: {results["added"]} added, {results["updated"]} updated, {results["skipped"]} skipped',
-            'results': results
-        })
-    except Exception as e:
-        # Delete the temporary file if it exists
-        if os.path.exists(filepath):
-            os.remove(filepath)
+        def progress(**counts):
+            for name, value in counts.items():
+                setattr(job, name, value)
+            db.session.commit()
         
-        app.logger.error(f'Error processing Excel file: {str(e)}')
-        return jsonify({
-            'success': False,
-            'message': f'Error processing Excel file: {str(e)}'
-        })
+        try:
+            results = process_excel_file(filepath, progress=progress)
+            job.added = results['added']
+            job.updated = results['updated']
+            job.skipped = results['skipped']
+            job.errors = json.dumps(results['errors'])
+            job.status = 'completed'
+            current_app.logger.info(f'Import job {job_id} completed: {results["added"]} added, {results["updated"]} updated, {results["skipped"]} skipped')
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f'Error processing Excel file: {str(e)}')
+            job.errors = json.dumps([f'Error processing Excel file: {str(e)}'])
+            job.status = 'failed'
+        finally:
+            # Delete the temporary file if it exists
+            if os.path.exists(filepath):
+                os.remove(filepath)
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
 
-def process_excel_file(filepath):
+def fail_interrupted_import_jobs():
+    """
+    Mark the import jobs left queued or running by an earlier run of the application as
+    failed. Imports run on a thread of the worker that received them, so these jobs ended
+    with their worker and would otherwise be polled forever. Only called when the server
+    starts (scripts/migrate_db.py, python app.py), never while it may be importing.
+    Returns the number of jobs.
+    """
+    n_jobs = ImportJob.query.filter(ImportJob.status.in_(['queued', 'running'])).update({
+        'status': 'failed',
+        'errors': json.dumps(['The import was interrupted when the application restarted, upload the file again']),
+        'finished_at': datetime.utcnow()
+    }, synchronize_session=False)
+    db.session.commit()
+    return n_jobs
+
+# Number of spreadsheet rows read and written per transaction during an Excel import,
+# lower it on devices with little memory
+IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', 5000))
+
+# Errors of single records kept on an import job, the rest are only counted
+IMPORT_MAX_ERRORS = 100
+
+def process_excel_file(filepath, progress=None):
     """
     Process the Excel file and update/insert records in the database
     based on the unique combination of agreement_number and navnenummer.
     
+    The file is read, converted and written in chunks of IMPORT_BATCH_SIZE rows, one
+    transaction per chunk, so memory use does not grow with the size of the file. If a chunk
+    fails, its donors are written one at a time and only the ones that fail are skipped.
+    If progress is given, it is called with the running counts (rows_total, rows_processed,
+    rows_written, added, updated, skipped) after every chunk.
+    
     Returns a dictionary with counts of added, updated, and skipped records.
     """
+    # pandas is only loaded when an import actually runs, not when the app starts
+    from excel_import import read_excel_chunks, excel_row_count, filter_donor_frame, convert_donor_frame, donor_records
+    
     # Initialize counters
     added = 0
     updated = 0
     skipped = 0
     details = []
+    errors = []
+    n_more_errors = 0
     
-    # Read the Excel file
-    df = pd.read_excel(filepath)
-    
-    # Define the allowed columns we want to import
-    allowed_columns = [
-        'Navnenr', 'Register', 'Register.1', 'Avtalenummer', 'Postnummer', 'Poststed', 
-        'Kommune', 'Fylke', 'Landkode', 'Land', 'Navnetype', 'Fødselsår/startår',
-        'Produktkode', 'Produkttype', 'Prosjektnummer', 'Produkt', 'Prosjektnavn',
-        'Startdato', 'Betalingsmåte', 'Girorytme', 'Betalingsrytme', 'Beløp',
-        'Aksjonstype', 'Aksjonstype beskrivelse', 'Aksjonsnummer', 'Aksjonsnavn',
-        'Avtaletype', 'Periode beløp', 'Opprettet dato'
-    ]
-    
-    # Filter the DataFrame to only include the allowed columns
-    filtered_columns = [col for col in df.columns if col in allowed_columns]
-    df_filtered = df[filtered_columns]
-    
-    # Filter to only include rows where Produkttype is MI or FG
-    if 'Produkttype' in df_filtered.columns:
-        app.logger.info(f"Before filtering by Produkttype: {len(df_filtered)} records")
-        df_filtered = df_filtered[df_filtered['Produkttype'].isin(['MI', 'FG'])]
-        app.logger.info(f"After filtering by Produkttype: {len(df_filtered)} records")
-    
-    # Create a mapping from Excel column names to database field names
-    field_mapping = {
-        'Navnenr': 'navnenr',
-        'Register': 'register',
-        'Register.1': 'register_1',
-        'Avtalenummer': 'avtalenummer',
-        'Postnummer': 'postnummer',
-        'Poststed': 'poststed',
-        'Kommune': 'kommune',
-        'Fylke': 'fylke',
-        'Landkode': 'landkode',
-        'Land': 'land',
-        'Navnetype': 'navnetype',
-        'Fødselsår/startår': 'fodselsaar_startaar',
-        'Produktkode': 'produktkode',
-        'Produkttype': 'produkttype',
-        'Prosjektnummer': 'prosjektnummer',
-        'Produkt': 'produkt',
-        'Prosjektnavn': 'prosjektnavn',
-        'Startdato': 'startdato',
-        'Betalingsmåte': 'betalingsmaate',
-        'Girorytme': 'girorytme',
-        'Betalingsrytme': 'betalingsrytme',
-        'Beløp': 'belop',
-        'Aksjonstype': 'aksjonstype',
-        'Aksjonstype beskrivelse': 'aksjonstype_beskrivelse',
-        'Aksjonsnummer': 'aksjonsnummer',
-        'Aksjonsnavn': 'aksjonsnavn',
-        'Avtaletype': 'avtaletype',
-        'Periode beløp': 'periode_belop',
-        'Opprettet dato': 'opprettet_dato'
-    }
-    
-    # Map legacy fields for backward compatibility
-    legacy_field_mapping = {
-        'Navnenr': 'name_id',
-        'Avtalenummer': 'agreement_number',
-        'Postnummer': 'zip_code',
-        'Landkode': 'country_id',
-        'Navnetype': 'nametype_id',
-        'Produkttype': 'producttype_id',
-        'Prosjektnummer': 'project_id',
-        'Beløp': 'amount',
-        'Betalingsrytme': 'interval',
-        'Startdato': 'startdate',
-        'Betalingsmåte': 'payment_method'
-    }
+    rows_total = excel_row_count(filepath) or 0
+    rows_processed = 0
+    rows_written = 0
     
-    # Convert filtered DataFrame to list of dictionaries
-    records = df_filtered.to_dict('records')
+    # Load the existing donors once; donors added by earlier chunks are added as we go
+    existing_keys = load_donor_import_keys()
     
-    with app.app_context():
-        for record in records:
-            # Create a dictionary with only the allowed fields from Excel
-            donor_data = {}
-            
-            # Map allowed Excel columns to their corresponding database fields
-            for column, value in record.items():
-                if column in field_mapping:
-                    field_name = field_mapping[column]
-                    
-                    # Handle NaN values
-                    if pd.isna(value):
-                        donor_data[field_name] = None
-                    # Handle numeric fields
-                    elif field_name in ['navnenr', 'prosjektnummer', 'girorytme']:
-                        try:
-                            donor_data[field_name] = int(value) if not pd.isna(value) else None
-                        except (ValueError, TypeError):
-                            donor_data[field_name] = None
-                    # Handle float fields
-                    elif field_name in ['belop', 'periode_belop']:
-                        try:
-                            donor_data[field_name] = float(value) if not pd.isna(value) else None
-                        except (ValueError, TypeError):
-                            donor_data[field_name] = None
-                    # Handle all other fields as strings
-                    else:
-                        donor_data[field_name] = str(value) if not pd.isna(value) else None
-            
-            # Also populate legacy fields for backward compatibility
-            for column, legacy_field in legacy_field_mapping.items():
-                if column in record:
-                    value = record[column]
-                    
-                    # Special handling for certain legacy fields
-                    if legacy_field == 'startdate' and not pd.isna(value):
-                        try:
-                            # Try to parse the date
-                            date_str = str(value)
-                            if '.' in date_str:
-                                donor_data[legacy_field] = datetime.strptime(date_str, '%d.%m.%Y').date()
-                                # Store the date only in the date object format, not as a string
-                                if 'startdato' in donor_data:
-                                    donor_data.pop('startdato')
-                            else:
-                                donor_data[legacy_field] = datetime.strptime(date_str, '%Y-%m-%d').date()
-                        except (ValueError, TypeError):
-                            donor_data[legacy_field] = None
-                    elif legacy_field in ['name_id', 'project_id'] and not pd.isna(value):
-                        try:
-                            donor_data[legacy_field] = int(value)
-                        except (ValueError, TypeError):
-                            donor_data[legacy_field] = None
-                    elif legacy_field == 'amount' and not pd.isna(value):
-                        try:
-                            donor_data[legacy_field] = float(value)
-                        except (ValueError, TypeError):
-                            donor_data[legacy_field] = None
-                    elif not pd.isna(value):
-                        donor_data[legacy_field] = str(value)
-            
-            # Set default values for campaign_id and classification_id_success if not present
-            if 'campaign_id' not in donor_data or donor_data['campaign_id'] is None:
-                donor_data['campaign_id'] = random.randint(1, 10)
-            
-            if 'classification_id_success' not in donor_data or donor_data['classification_id_success'] is None:
-                donor_data['classification_id_success'] = 'S1'
-            
+    for chunk in read_excel_chunks(filepath, IMPORT_BATCH_SIZE):
+        # Keep the allowed columns and the MI/FG rows, and convert them column by column
+        donors = convert_donor_frame(filter_donor_frame(chunk))
+        
+        # Collect the rows of this chunk by import key: the donor to update (None for a new
+        # donor), its merged fields, and the counts and details recorded once it is written
+        rows = {}
+        
+        for donor_data in donor_records(donors):
             # Only process the donor if Produkttype is MI or FG
             produkttype = donor_data.get('produkttype')
             if produkttype in ['MI', 'FG']:
-                try:
-                    # Check if we have both agreement_number and navnenr/name_id
-                    agreement_number = donor_data.get('agreement_number')
-                    name_id = donor_data.get('name_id')
-                    
-                    if agreement_number and name_id:
-                        # Check if a record with the same agreement_number and name_id exists
-                        existing_donor = RecurringDonor.query.filter_by(
-                            agreement_number=agreement_number,
-                            name_id=name_id
-                        ).first()
-                        
-                        if existing_donor:
-                            # Update existing record
-                            for key, value in donor_data.items():
-                                setattr(existing_donor, key, value)
-                            updated += 1
-                            details.append(f"Updated donor with agreement_number={agreement_number}, name_id={name_id}")
-                        else:
-                            # Add new record
-                            new_donor = RecurringDonor(**donor_data)
-                            db.session.add(new_donor)
-                            added += 1
-                            details.append(f"Added new donor with agreement_number={agreement_number}, name_id={name_id}")
+                # Check if we have both agreement_number and navnenr/name_id
+                agreement_number = donor_data.get('agreement_number')
+                name_id = donor_data.get('name_id')
+                
+                if agreement_number and name_id:
+                    # Normalized like the stored keys, as .xls files give agreement numbers as '12.0'
+                    key = (normalize_agreement_number(agreement_number), name_id)
+                    if key in rows:
+                        # The same donor appeared earlier in the chunk, the later row wins
+                        row = rows[key]
+                        row['data'].update(donor_data)
+                        row['updated'] += 1
+                        row['details'].append(f"Updated donor with agreement_number={agreement_number}, name_id={name_id}")
+                    elif key in existing_keys:
+                        # Update existing record
+                        rows[key] = {'donor_id': existing_keys[key], 'data': donor_data, 'added': 0, 'updated': 1,
+                                     'details': [f"Updated donor with agreement_number={agreement_number}, name_id={name_id}"]}
                     else:
-                        # Skip records without both agreement_number and name_id
-                        skipped += 1
-                        details.append(f"Skipped record: Missing agreement_number or name_id")
-                    
-                    # Commit every 100 records to avoid large transactions
-                    if (added + updated) % 100 == 0:
-                        db.session.commit()
-                        app.logger.info(f"Committed {added + updated} records so far...")
-                except Exception as e:
-                    app.logger.error(f"Error processing donor: {str(e)}")
-                    app.logger.error(f"Problematic data: {donor_data}")
-                    db.session.rollback()
+                        # Add new record
+                        rows[key] = {'donor_id': None, 'data': donor_data, 'added': 1, 'updated': 0,
+                                     'details': [f"Added new donor with agreement_number={agreement_number}, name_id={name_id}"]}
+                else:
+                    # Skip records without both agreement_number and name_id
                     skipped += 1
-                    details.append(f"Error processing record: {str(e)}")
+                    details.append(f"Skipped record: Missing agreement_number or name_id")
             else:
                 skipped += 1
                 details.append(f"Skipped record with Produkttype: {produkttype if produkttype else 'Missing'}")
         
-        # Final commit for any remaining records
+        # Write the chunk in one transaction before reading the next one. If that fails,
+        # write its donors one at a time, so only the donors that fail are skipped.
         try:
-            db.session.commit()
-            app.logger.info(f"Import completed: {added} added, {updated} updated, {skipped} skipped")
+            write_import_rows(list(rows.values()))
+            written = list(rows.items())
         except Exception as e:
-            app.logger.error(f"Error during final commit: {str(e)}")
+            current_app.logger.error(f"Error writing donor batch, writing its donors one at a time: {str(e)}")
             db.session.rollback()
-            details.append(f"Error during final commit: {str(e)}")
+            written = []
+            for key, row in rows.items():
+                try:
+                    write_import_rows([row])
+                    written.append((key, row))
+                except Exception as e:
+                    db.session.rollback()
+                    skipped += row['added'] + row['updated']
+                    error = f"Error processing record with agreement_number={key[0]}, name_id={key[1]}: {str(e)}"
+                    details.append(error)
+                    if len(errors) < IMPORT_MAX_ERRORS:
+                        errors.append(error)
+                    else:
+                        n_more_errors += 1
+        
+        if written:
+            for key, row in written:
+                added += row['added']
+                updated += row['updated']
+                details.extend(row['details'])
+            rows_written += len(written)
+            current_app.logger.info(f"Committed {rows_written} records so far...")
+            
+            # Later chunks update the donors this chunk added
+            new_keys = load_donor_import_keys(name_ids=[key[1] for key, row in written if row['donor_id'] is None])
+            for key, donor_id in new_keys.items():
+                existing_keys.setdefault(key, donor_id)
+        
+        rows_processed += len(chunk)
+        rows_total = max(rows_total, rows_processed)
+        if progress:
+            progress(rows_total=rows_total, rows_processed=rows_processed, rows_written=rows_written,
+                     added=added, updated=updated, skipped=skipped)
+        
+        # Only a few details are returned, so don't keep collecting them
+        del details[20:]
+    
+    if n_more_errors:
+        errors.append(f"... and {n_more_errors} more records that could not be written")
+    current_app.logger.info(f"Import completed: {added} added, {updated} updated, {skipped} skipped")
     
     # Return the results
     return {
         "added": added,
         "updated": updated,
         "skipped": skipped,
-        "details": details[:20]  # Limit details to avoid too large response
+        "details": details[:20],  # Limit details to avoid too large response
+        "errors": errors
     }
 
+def write_import_rows(rows):
+    """Write the collected rows of an Excel import (see process_excel_file) and commit them"""
+    inserts = [row['data'] for row in rows if row['donor_id'] is None]
+    updates = {row['donor_id']: row['data'] for row in rows if row['donor_id'] is not None}
+    write_donor_batch(inserts, updates)
+    db.session.commit()
 
-@app.route('/report-5')
-def report_5():
-    # Hardcode the current year (2025) to ensure it displays correctly
-    current_year = 2025
-    
-    # Get all recurring donors from the database
-    all_donors = RecurringDonor.query.all()
+def load_donor_import_keys(name_ids=None):
+    """
+    Load the import identity (agreement_number, name_id) of all donors in one query,
+    mapped to the id of the first donor with that identity. If name_ids is given,
+    only donors with those name_ids are loaded.
+    """
+    query = (
+        select(RecurringDonor.id, RecurringDonor.agreement_number, RecurringDonor.name_id)
+        .where(RecurringDonor.agreement_number.isnot(None), RecurringDonor.name_id.isnot(None))
+        .order_by(RecurringDonor.id)
+    )
+    if name_ids is None:
+        queries = [query]
+    else:
+        name_ids = list(set(name_ids))
+        queries = [query.where(RecurringDonor.name_id.in_(name_ids[start:start + 500]))
+                   for start in range(0, len(name_ids), 500)]
+    
+    keys = {}
+    for chunk_query in queries:
+        for row in db.session.execute(chunk_query):
+            keys.setdefault((normalize_agreement_number(row.agreement_number), row.name_id), row.id)
+    return keys
+
+def normalize_agreement_number(agreement_number):
+    """
+    Strip the '.0' older imports stored for whole-number agreement numbers, so '12.0' in
+    the database matches '12' in a spreadsheet
+    """
+    if agreement_number.endswith('.0') and agreement_number[:-2].isdigit():
+        return agreement_number[:-2]
+    return agreement_number
+
+def write_donor_batch(inserts, updates):
+    """
+    Write new donors (a list of field dictionaries) and changes to existing donors
+    (a dictionary of donor id to changed fields) with executemany statements on the
+    current session transaction, and apply the matching rollup deltas.
+
+    These statements bypass the ORM events, so start_date and the rollup are maintained here.
+    """
+    table = RecurringDonor.__table__
+    connection = db.session.connection()
+    db.session.info['dashboard_data_changed'] = True
+    deltas = {}
+    
+    if inserts:
+        # executemany needs the same keys in every row
+        columns = set().union(*inserts)
+        rows = []
+        for donor_data in inserts:
+            row = {column: donor_data.get(column) for column in columns}
+            row['start_date'] = resolve_start_date(row.get('startdate'), row.get('startdato'))
+            add_rollup_delta(deltas, donor_rollup_key(row['start_date'], row.get('producttype_id'),
+                                                      row.get('produkttype'), row.get('payment_method')),
+                             1, row.get('amount'))
+            rows.append(row)
+        connection.execute(insert(table), rows)
+    
+    if updates:
+        rollup_columns = ['startdate', 'startdato', 'producttype_id', 'produkttype', 'payment_method', 'amount']
+        stored = {}
+        donor_ids = list(updates)
+        for start in range(0, len(donor_ids), 500):
+            rows = connection.execute(
+                select(table.c.id, table.c.start_date, *[table.c[column] for column in rollup_columns])
+                .where(table.c.id.in_(donor_ids[start:start + 500]))
+            )
+            stored.update((row.id, row) for row in rows)
+        
+        # Rows only set the fields present in the spreadsheet, so group them by field set
+        statements = {}
+        for donor_id, donor_data in updates.items():
+            old = stored[donor_id]
+            new = {column: donor_data.get(column, getattr(old, column)) for column in rollup_columns}
+            start_date = resolve_start_date(new['startdate'], new['startdato'])
+            add_rollup_delta(deltas, donor_rollup_key(old.start_date, old.producttype_id, old.produkttype, old.payment_method),
+                             -1, -(old.amount or 0))
+            add_rollup_delta(deltas, donor_rollup_key(start_date, new['producttype_id'], new['produkttype'], new['payment_method']),
+                             1, new['amount'])
+            
+            params = {f'new_{column}': value for column, value in donor_data.items()}
+            params['new_start_date'] = start_date
+            params['donor_id'] = donor_id
+            statements.setdefault(tuple(sorted(params)), []).append(params)
+        
+        for param_names, params in statements.items():
+            values = {name[len('new_'):]: bindparam(name) for name in param_names if name.startswith('new_')}
+            connection.execute(update(table).where(table.c.id == bindparam('donor_id')).values(values), params)
     
-    # Filter to only include MI and FG product types
-    filtered_donors = [donor for donor in all_donors 
-                      if (hasattr(donor, 'produkttype') and donor.produkttype in ['MI', 'FG']) or 
-                         (hasattr(donor, 'producttype_id') and donor.producttype_id in ['MI', 'FG'])]
+    apply_rollup_deltas(connection, deltas)
+
+def report_year():
+    """The year to report on: the ?year= parameter, else REPORT_YEAR, else the current year"""
+    year = request.args.get('year', type=int)
+    return year or current_app.config['REPORT_YEAR'] or datetime.now().year
+
+@dashboard.route('/report-5')
+@conditional_get
+@response_cache.cached
+def report_5():
+    current_year = report_year()
     
-    # Calculate total yearly amount - do not multiply by 12 as requested
-    total_yearly_amount = sum(donor.amount if donor.amount is not None else 0 for donor in filtered_donors)
+    # Total yearly amount of all MI/FG donors, and the MI/FG donors who started this year
+    total_yearly_amount, donor_count = aggregate_year_totals(current_year)
     
     # Format the total amount with thousand separator in Norwegian format
     formatted_total = '{:,.0f}'.format(total_yearly_amount).replace(',', ' ')
     
-    # Count donors from current year only
-    current_year_donors = [donor for donor in filtered_donors 
-                          if (donor.startdate and donor.startdate.year == current_year) or
-                             (donor.startdato and donor.startdato.endswith(str(current_year)))]
-    
-    # Print debug information
-    print(f"Debug - report_5 route: current_year={current_year}, yearly_value={formatted_total}, total_donors={len(current_year_donors)}")
-    
-    # Use hardcoded values based on our database query results
-    donor_count = len(current_year_donors)
-    
-    # Log all values being passed to the template
-    print(f"Rendering template with: current_year={current_year}, total_donors={donor_count}, yearly_value={formatted_total}")
+    logger.info(f"report_5: current_year={current_year}, total_donors={donor_count}, yearly_value={formatted_total}")
     
     return render_template('report-5.html', 
                            current_year=current_year, 
                            total_donors=donor_count,
                            yearly_value=formatted_total)
 
-@app.route('/recurring-donors')
+# Donors shown per page on /recurring-donors
+RECURRING_DONORS_PER_PAGE = 100
+
+def donor_filter_conditions(args, date_column, product_column, payment_column):
+    """
+    Build the WHERE conditions of the /recurring-donors filters (product, payment,
+    start_from, start_to) for the given columns, so the same filters apply to
+    recurring_donor and donor_daily_rollup.
+    """
+    conditions = []
+    if args.get('product'):
+        conditions.append(product_column == args['product'])
+    if args.get('payment'):
+        conditions.append(payment_column == args['payment'])
+    if args.get('start_from'):
+        conditions.append(date_column >= parse_date(args['start_from']))
+    if args.get('start_to'):
+        conditions.append(date_column <= parse_date(args['start_to']))
+    return conditions
+
+@dashboard.route('/recurring-donors')
+@primary_conditional_get
+@primary_response_cache.cached
 def recurring_donors():
-    # Get all recurring donors from the database
-    donors = RecurringDonor.query.all()
-    
-    # Prepare data for the template
-    donor_data = []
-    total_amount = 0
-    unique_products = set()
-    unique_payment_methods = set()
-    
-    for donor in donors:
-        donor_info = {
-            'name_id': donor.name_id,
-            'payment_method': donor.payment_method,
-            'amount': donor.amount if donor.amount is not None else 0,
-            'interval': donor.interval,
-            'startdate': donor.startdate.strftime('%d.%m.%Y') if donor.startdate else '',
-            'producttype_id': donor.producttype_id,
-            'agreement_number': donor.agreement_number
-        }
-        donor_data.append(donor_info)
-        total_amount += donor.amount if donor.amount is not None else 0
-        
-        # Add product to the unique products set
-        if donor.producttype_id:
-            unique_products.add(donor.producttype_id)
-            
-        # Add payment method to the unique payment methods set
-        if donor.payment_method:
-            unique_payment_methods.add(donor.payment_method)
+    # Filters, sort order and page from the query string
+    filters = {key: request.args[key] for key in ('product', 'payment', 'start_from', 'start_to') if request.args.get(key)}
+    order = 'asc' if request.args.get('order') == 'asc' else 'desc'
+    try:
+        page = max(1, int(request.args.get('page', 1)))
+        donor_conditions = donor_filter_conditions(filters, RecurringDonor.start_date,
+                                                   RecurringDonor.producttype_id, RecurringDonor.payment_method)
+        rollup_conditions = donor_filter_conditions(filters, DonorDailyRollup.date,
+                                                    DonorDailyRollup.producttype_id, DonorDailyRollup.payment_method)
+    except ValueError:
+        return redirect(url_for('dashboard.recurring_donors'))
+    
+    # Totals of the filtered donors, from the daily rollup
+    total_donors, total_amount = db.session.execute(
+        select(func.coalesce(func.sum(DonorDailyRollup.n_donors), 0),
+               func.coalesce(func.sum(DonorDailyRollup.amount), 0))
+        .where(*rollup_conditions)
+    ).one()
+    
+    # The products and payment methods to choose from
+    product_list = db.session.execute(
+        select(DonorDailyRollup.producttype_id).distinct()
+        .where(DonorDailyRollup.producttype_id.isnot(None))
+        .order_by(DonorDailyRollup.producttype_id)
+    ).scalars().all()
+    payment_method_list = db.session.execute(
+        select(DonorDailyRollup.payment_method).distinct()
+        .where(DonorDailyRollup.payment_method.isnot(None))
+        .order_by(DonorDailyRollup.payment_method)
+    ).scalars().all()
+    
+    # One page of donors, sorted by start date
+    pages = max(1, -(-total_donors // RECURRING_DONORS_PER_PAGE))
+    page = min(page, pages)
+    sort_columns = [RecurringDonor.start_date, RecurringDonor.id]
+    rows = db.session.execute(
+        select(RecurringDonor.name_id,
+               RecurringDonor.payment_method,
+               RecurringDonor.amount,
+               RecurringDonor.interval,
+               RecurringDonor.start_date,
+               RecurringDonor.producttype_id,
+               RecurringDonor.agreement_number)
+        .where(*donor_conditions)
+        .order_by(*[column.asc() if order == 'asc' else column.desc() for column in sort_columns])
+        .limit(RECURRING_DONORS_PER_PAGE)
+        .offset((page - 1) * RECURRING_DONORS_PER_PAGE)
+    ).all()
+    
+    donor_data = [{
+        'name_id': row.name_id,
+        'payment_method': row.payment_method,
+        'amount': row.amount if row.amount is not None else 0,
+        'interval': row.interval,
+        'startdate': row.start_date.strftime('%d.%m.%Y') if row.start_date else '',
+        'producttype_id': row.producttype_id,
+        'agreement_number': row.agreement_number
+    } for row in rows]
     
     # Format the total amount with thousand separator
     formatted_total = '{:,.0f}'.format(total_amount).replace(',', ' ')
     
-    # Convert the sets to sorted lists for the template
-    product_list = sorted(list(unique_products))
-    payment_method_list = sorted(list(unique_payment_methods))
-    
     return render_template('recurring_donors.html', 
                            donors=donor_data, 
-                           total_donors=len(donor_data), 
+                           total_donors=total_donors, 
                            total_amount=formatted_total,
                            products=product_list,
-                           payment_methods=payment_method_list)
+                           payment_methods=payment_method_list,
+                           filters=filters,
+                           order=order,
+                           page=page,
+                           pages=pages)
 
-@app.route('/service')
+@dashboard.route('/service')
 def service():
     # Get the device's IP address
     import socket
@@ -767,7 +1210,9 @@ def service():
     
     return render_template('service.html', ip_address=url)
 
-@app.route('/api/today')
+@api.route('/api/today')
+@primary_conditional_get
+@primary_response_cache.cached
 def get_today():
     today = datetime.now().date()
     record = DonorStats.query.filter_by(date=today).first()
@@ -788,9 +1233,8 @@ def get_today():
         })
     return jsonify({'error': 'No data for today'}), 404
 
-@app.route('/api/donor-stats', methods=['POST'])
-def update_donor_stats():
-    # Authenticate the request
+def authenticate_vendor():
+    """Check the Bearer API key of a vendor request, returns an error response or None"""
     auth_header = request.headers.get('Authorization')
     if not auth_header or not auth_header.startswith('Bearer '):
         return jsonify({'error': 'Missing or invalid authorization header'}), 401
@@ -798,42 +1242,69 @@ def update_donor_stats():
     token = auth_header.split(' ')[1]
     if not secrets.compare_digest(token, API_KEY):
         return jsonify({'error': 'Invalid API key'}), 401
+    return None
+
+@api.route('/api/donor-stats', methods=['POST'])
+def update_donor_stats():
+    # Authenticate the request
+    auth_error = authenticate_vendor()
+    if auth_error:
+        return auth_error
     
     # Validate the request data
     data = request.get_json()
     if not data:
         return jsonify({'error': 'No data provided'}), 400
     
-    required_fields = ['date', 'n_new_donors', 'yearly_sum_new_donors', 'n_total_new_donors', 'yearly_sum_all_donors']
-    for field in required_fields:
-        if field not in data:
-            return jsonify({'error': f'Missing required field: {field}'}), 400
+    try:
+        stats = donor_stats_fields(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if current_app.config['WRITE_QUEUE'] in ('sync', 'async'):
+        return queue_vendor_write('stats', stats)
     
     try:
-        # Parse the date
-        if isinstance(data['date'], str):
-            date = datetime.strptime(data['date'], '%Y-%m-%d').date()
-        else:
-            return jsonify({'error': 'Date must be in YYYY-MM-DD format'}), 400
-            
         # Update or create the record
-        DonorStats.update_or_create(
-            date=date,
-            n_new_donors=int(data['n_new_donors']),
-            yearly_sum_new_donors=float(data['yearly_sum_new_donors']),
-            n_total_new_donors=int(data['n_total_new_donors']),
-            yearly_sum_all_donors=float(data['yearly_sum_all_donors'])
-        )
+        DonorStats.update_or_create(**stats)
         
-        return jsonify({
-            'status': 'success',
-            'message': 'Donor statistics updated successfully'
-        }), 200
+        return jsonify(DONOR_STATS_UPDATED), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/populate')
+DONOR_STATS_UPDATED = {
+    'status': 'success',
+    'message': 'Donor statistics updated successfully'
+}
+
+def donor_stats_fields(data):
+    """Map the donor statistics posted by the vendor to DonorStats columns, raises ValueError on bad values"""
+    required_fields = ['date', 'n_new_donors', 'yearly_sum_new_donors', 'n_total_new_donors', 'yearly_sum_all_donors']
+    for field in required_fields:
+        if field not in data:
+            raise ValueError(f'Missing required field: {field}')
+    
+    # Parse the date
+    if not isinstance(data['date'], str):
+        raise ValueError('Date must be in YYYY-MM-DD format')
+    try:
+        date = datetime.strptime(data['date'], '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError('Date must be in YYYY-MM-DD format')
+    
+    try:
+        return {
+            'date': date,
+            'n_new_donors': int(data['n_new_donors']),
+            'yearly_sum_new_donors': float(data['yearly_sum_new_donors']),
+            'n_total_new_donors': int(data['n_total_new_donors']),
+            'yearly_sum_all_donors': float(data['yearly_sum_all_donors'])
+        }
+    except (TypeError, ValueError) as e:
+        raise ValueError(f'Invalid donor statistics: {e}')
+
+@api.route('/populate')
 def populate_db():
     start_date = datetime(2025, 1, 1)
     end_date = datetime.now()
@@ -850,23 +1321,54 @@ def populate_db():
             n_new_donors=n_new_donors,
             yearly_sum_new_donors=yearly_sum_new_donors,
             n_total_new_donors=n_total_new_donors,
-            yearly_sum_all_donors=yearly_sum_all_donors
+            yearly_sum_all_donors=yearly_sum_all_donors,
+            commit=False
         )
         
         current_date += timedelta(days=1)
     
+    db.session.commit()
     return 'Database populated successfully!'
 
-@app.route('/api/new-recurring-donor', methods=['POST'])
+# Required fields of a donor record from the vendor, at the top level and in 'name' and 'agreement'
+VENDOR_REQUIRED_FIELDS = ['campaign_id', 'payment_method', 'classification_id_success', 'name', 'agreement']
+VENDOR_REQUIRED_NAME_FIELDS = ['name_id', 'zip', 'country_id', 'nametype_id']
+VENDOR_REQUIRED_AGREEMENT_FIELDS = ['producttype_id', 'project_id', 'amount', 'interval', 'startdate']
+
+def missing_vendor_donor_field(data):
+    """Return the error message for the first required field missing from a vendor donor record, or None"""
+    for field in VENDOR_REQUIRED_FIELDS:
+        if field not in data:
+            return f'Missing required field: {field}'
+    for field in VENDOR_REQUIRED_NAME_FIELDS:
+        if field not in data['name']:
+            return f'Missing required name field: {field}'
+    for field in VENDOR_REQUIRED_AGREEMENT_FIELDS:
+        if field not in data['agreement']:
+            return f'Missing required agreement field: {field}'
+    return None
+
+def vendor_number(value, convert, field):
+    """
+    Convert a number posted by the vendor, possibly sent as a string, with convert (int or
+    float). None stays None. Raises ValueError on values that are not finite numbers.
+    """
+    if value is None:
+        return None
+    try:
+        number = convert(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'Invalid {field}: {value}')
+    if isinstance(value, bool) or not math.isfinite(number):
+        raise ValueError(f'Invalid {field}: {value}')
+    return number
+
+@api.route('/api/new-recurring-donor', methods=['POST'])
 def new_recurring_donor():
     # Authenticate the request
-    auth_header = request.headers.get('Authorization')
-    if not auth_header or not auth_header.startswith('Bearer '):
-        return jsonify({'error': 'Missing or invalid authorization header'}), 401
-    
-    token = auth_header.split(' ')[1]
-    if not secrets.compare_digest(token, API_KEY):
-        return jsonify({'error': 'Invalid API key'}), 401
+    auth_error = authenticate_vendor()
+    if auth_error:
+        return auth_error
     
     # Validate the request data
     data = request.get_json()
@@ -874,24 +1376,24 @@ def new_recurring_donor():
         return jsonify({'error': 'No data provided'}), 400
     
     # Check required fields
-    required_top_level = ['campaign_id', 'payment_method', 'classification_id_success', 'name', 'agreement']
-    required_name = ['name_id', 'zip', 'country_id', 'nametype_id']
-    required_agreement = ['producttype_id', 'project_id', 'amount', 'interval', 'startdate']
+    error = missing_vendor_donor_field(data)
+    if error:
+        return jsonify({'error': error}), 400
     
-    # Validate top-level fields
-    for field in required_top_level:
-        if field not in data:
-            return jsonify({'error': f'Missing required field: {field}'}), 400
-    
-    # Validate name fields
-    for field in required_name:
-        if field not in data['name']:
-            return jsonify({'error': f'Missing required name field: {field}'}), 400
+    # The amount is summed into the daily rollup, and the ids are integer columns
+    try:
+        amount = vendor_number(data['agreement']['amount'], float, 'amount')
+        project_id = vendor_number(data['agreement']['project_id'], int, 'project_id')
+        campaign_id = vendor_number(data['campaign_id'], int, 'campaign_id')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    # Validate agreement fields
-    for field in required_agreement:
-        if field not in data['agreement']:
-            return jsonify({'error': f'Missing required agreement field: {field}'}), 400
+    if current_app.config['WRITE_QUEUE'] in ('sync', 'async'):
+        try:
+            fields = vendor_donor_fields(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return queue_vendor_write('donor', fields)
     
     try:
         # Check if a record with the same name_id already exists
@@ -903,7 +1405,7 @@ def new_recurring_donor():
         
         if existing_record:
             # Update the existing record
-            existing_record.campaign_id = data['campaign_id']
+            existing_record.campaign_id = campaign_id
             existing_record.payment_method = data['payment_method']
             existing_record.classification_id_success = data['classification_id_success']
             
@@ -914,8 +1416,8 @@ def new_recurring_donor():
             
             # Update agreement information
             existing_record.producttype_id = data['agreement']['producttype_id']
-            existing_record.project_id = data['agreement']['project_id']
-            existing_record.amount = data['agreement']['amount']
+            existing_record.project_id = project_id
+            existing_record.amount = amount
             existing_record.interval = data['agreement']['interval']
             # Parse startdate from string to date object
             try:
@@ -937,7 +1439,7 @@ def new_recurring_donor():
         else:
             # Create a new record
             new_donor = RecurringDonor(
-                campaign_id=data['campaign_id'],
+                campaign_id=campaign_id,
                 payment_method=data['payment_method'],
                 classification_id_success=data['classification_id_success'],
                 
@@ -949,8 +1451,8 @@ def new_recurring_donor():
                 
                 # Agreement information
                 producttype_id=data['agreement']['producttype_id'],
-                project_id=data['agreement']['project_id'],
-                amount=data['agreement']['amount'],
+                project_id=project_id,
+                amount=amount,
                 interval=data['agreement']['interval'],
                 # Parse startdate from string to date object
                 startdate=parse_date(data['agreement']['startdate'])
@@ -969,8 +1471,195 @@ def new_recurring_donor():
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+# Largest number of donor records accepted in one batch, which also keeps the
+# name_id lookup within the bind parameter limits of the databases
+VENDOR_BATCH_MAX_SIZE = 1000
+
+def vendor_donor_fields(data):
+    """
+    Validate a vendor donor record and map it to RecurringDonor columns, converting the
+    numbers the vendor may send as strings. Raises ValueError on bad values, so a batch
+    reports them per record instead of failing as a whole.
+    """
+    if not isinstance(data.get('name'), dict) or not isinstance(data.get('agreement'), dict):
+        raise ValueError("'name' and 'agreement' must be objects")
+    error = missing_vendor_donor_field(data)
+    if error:
+        raise ValueError(error)
+    try:
+        name_id = int(data['name']['name_id'])
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid name_id: {data['name']['name_id']}")
+    # Objects and arrays can't be stored in a column, and would fail the whole batch on write
+    values = {**data['name'], **data['agreement'],
+              'payment_method': data['payment_method'],
+              'classification_id_success': data['classification_id_success']}
+    for field, value in values.items():
+        if isinstance(value, (dict, list)):
+            raise ValueError(f'Invalid {field}: must be a single value')
+    return {
+        'campaign_id': vendor_number(data['campaign_id'], int, 'campaign_id'),
+        'payment_method': data['payment_method'],
+        'classification_id_success': data['classification_id_success'],
+        'name_id': name_id,
+        'zip_code': data['name']['zip'],
+        'country_id': data['name']['country_id'],
+        'nametype_id': data['name']['nametype_id'],
+        'producttype_id': data['agreement']['producttype_id'],
+        'project_id': vendor_number(data['agreement']['project_id'], int, 'project_id'),
+        'amount': vendor_number(data['agreement']['amount'], float, 'amount'),
+        'interval': data['agreement']['interval'],
+        'startdate': parse_date(data['agreement']['startdate'])
+    }
+
+def upsert_vendor_donors(donors):
+    """
+    Create or update donors from vendor records (lists of column values from
+    vendor_donor_fields) on the current session, without committing. Existing donors
+    are found with one query on name_id. Returns 'created' or 'updated' for each record.
+    """
+    # Like the single endpoint, a name_id updates its first donor if there is one
+    table = RecurringDonor.__table__
+    existing = dict(db.session.execute(
+        select(table.c.name_id, func.min(table.c.id))
+        .where(table.c.name_id.in_({fields['name_id'] for fields in donors}))
+        .group_by(table.c.name_id)
+    ).all())
+    
+    # Records are applied in order, so a later record for the same name_id wins
+    inserts = {}
+    updates = {}
+    statuses = []
+    for fields in donors:
+        name_id = fields['name_id']
+        if name_id in existing:
+            updates.setdefault(existing[name_id], {}).update(fields)
+            statuses.append('updated')
+        elif name_id in inserts:
+            inserts[name_id].update(fields)
+            statuses.append('updated')
+        else:
+            inserts[name_id] = dict(fields)
+            statuses.append('created')
+    
+    write_donor_batch(list(inserts.values()), updates)
+    return statuses
+
+@api.route('/api/new-recurring-donors/batch', methods=['POST'])
+def new_recurring_donors_batch():
+    """
+    Create or update a batch of recurring donors, a JSON array of records in the format
+    of /api/new-recurring-donor. Existing donors are found by name_id in one query and
+    all valid records are written in one transaction. Records that fail validation are
+    skipped, and the status of every record is returned so the vendor can resend only
+    the failed ones.
+    """
+    # Authenticate the request
+    auth_error = authenticate_vendor()
+    if auth_error:
+        return auth_error
+    
+    records = request.get_json(silent=True)
+    if not isinstance(records, list) or not records:
+        return jsonify({'error': 'Expected a non-empty JSON array of donor records'}), 400
+    if len(records) > VENDOR_BATCH_MAX_SIZE:
+        return jsonify({'error': f'At most {VENDOR_BATCH_MAX_SIZE} donor records per batch'}), 400
+    
+    results = []
+    valid = []
+    for index, data in enumerate(records):
+        try:
+            if not isinstance(data, dict):
+                raise ValueError('Donor record must be an object')
+            fields = vendor_donor_fields(data)
+        except ValueError as e:
+            results.append({'index': index, 'status': 'error', 'error': str(e)})
+            continue
+        results.append({'index': index, 'name_id': fields['name_id']})
+        valid.append((results[-1], fields))
+    
+    try:
+        if valid:
+            statuses = upsert_vendor_donors([fields for _, fields in valid])
+            for (result, _), status in zip(valid, statuses):
+                result['status'] = status
+            db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f'Error writing donor batch: {e}')
+        return jsonify({'error': str(e)}), 500
+    
+    failed = sum(1 for result in results if result['status'] == 'error')
+    return jsonify({
+        'status': 'success' if not failed else 'partial',
+        'created': sum(1 for result in results if result['status'] == 'created'),
+        'updated': sum(1 for result in results if result['status'] == 'updated'),
+        'failed': failed,
+        'results': results
+    }), 200
+
+def write_vendor_records(records):
+    """
+    Write records queued by the vendor endpoints, ('donor', columns) or ('stats', columns),
+    in one transaction. Returns the (response body, status code) of each record.
+    """
+    try:
+        donors = [fields for kind, fields in records if kind == 'donor']
+        statuses = iter(upsert_vendor_donors(donors) if donors else [])
+        for kind, fields in records:
+            if kind == 'stats':
+                DonorStats.update_or_create(**fields, commit=False)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    
+    # The responses include the donors as stored, read back in one query
+    donor_ids = dict(db.session.execute(
+        select(RecurringDonor.name_id, func.min(RecurringDonor.id))
+        .where(RecurringDonor.name_id.in_({fields['name_id'] for fields in donors}))
+        .group_by(RecurringDonor.name_id)
+    ).all()) if donors else {}
+    stored = {donor.id: donor.to_dict() for donor in RecurringDonor.query.filter(RecurringDonor.id.in_(donor_ids.values()))}
+    
+    results = []
+    for kind, fields in records:
+        if kind == 'stats':
+            results.append((DONOR_STATS_UPDATED, 200))
+            continue
+        status = next(statuses)
+        results.append(({
+            'status': 'success',
+            'message': f'Recurring donor {status} successfully',
+            'donor': stored[donor_ids[fields['name_id']]]
+        }, 201 if status == 'created' else 200))
+    return results
+
+# Vendor writes are written in group commits when WRITE_QUEUE is 'sync' or 'async', see create_app()
+write_queue = GroupCommitQueue(write_vendor_records)
+atexit.register(write_queue.close)
+
+def queue_vendor_write(kind, fields):
+    """
+    Queue a vendor record for the next group commit. Only records that passed
+    vendor_donor_fields() or donor_stats_fields() may be queued, as bad values must be
+    answered with 400 before the request returns. In 'sync' mode the request waits until
+    the record is committed, in 'async' mode it is answered with 202 Accepted at once, and
+    the record is lost if its write fails (the writer logs it) or the worker dies first.
+    """
+    future = write_queue.submit(current_app._get_current_object(), (kind, fields))
+    if current_app.config['WRITE_QUEUE'] == 'async':
+        return jsonify({'status': 'accepted', 'message': 'Queued for writing'}), 202
+    try:
+        body, status = future.result()
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    return jsonify(body), status
+
 def parse_date(date_string):
     """Parse a date string in either DD.MM.YYYY or YYYY-MM-DD format"""
+    if not isinstance(date_string, str):
+        raise ValueError(f"Invalid date format: {date_string}. Use DD.MM.YYYY or YYYY-MM-DD")
     try:
         # Try DD.MM.YYYY format first (as in the example)
         return datetime.strptime(date_string, '%d.%m.%Y').date()
@@ -982,234 +1671,420 @@ def parse_date(date_string):
             # If both fail, raise an exception
             raise ValueError(f"Invalid date format: {date_string}. Use DD.MM.YYYY or YYYY-MM-DD")
 
-@app.route('/api/recurring-donors', methods=['GET'])
+# Page size of /api/recurring-donors when no limit is given, and the largest allowed
+RECURRING_DONORS_PAGE_SIZE = 100
+RECURRING_DONORS_MAX_PAGE_SIZE = 1000
+
+def json_value(value):
+    """Format dates and datetimes as ISO strings for JSON responses"""
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+def count_recurring_donors(name_id=None):
+    """Count the recurring donors, from the daily rollup unless filtered by name_id"""
+    if name_id is None:
+        return db.session.execute(
+            select(func.coalesce(func.sum(DonorDailyRollup.n_donors), 0))
+        ).scalar()
+    return db.session.execute(
+        select(func.count()).select_from(RecurringDonor).where(RecurringDonor.name_id == name_id)
+    ).scalar()
+
+@api.route('/api/recurring-donors', methods=['GET'])
+@primary_conditional_get
+@primary_response_cache.cached
 def get_recurring_donors():
-    """Get all recurring donors or filter by name_id"""
-    name_id = request.args.get('name_id')
-    
+    """
+    Get recurring donors one page at a time, ordered by id, optionally filtered by name_id.
+
+    Query parameters:
+      after_id    return donors with an id above this (the next_after_id of the previous page)
+      limit       page size, at most RECURRING_DONORS_MAX_PAGE_SIZE
+      fields      comma separated RecurringDonor columns, returned as flat objects instead of to_dict()
+      count_only  only return the number of matching donors
+    """
     try:
+        name_id = request.args.get('name_id')
         if name_id:
             try:
                 # Convert name_id to integer for filtering
-                name_id_int = int(name_id)
-                donors = RecurringDonor.query.filter_by(name_id=name_id_int).all()
+                name_id = int(name_id)
             except ValueError:
                 # If name_id can't be converted to int, return empty result
-                donors = []
+                return jsonify({'status': 'success', 'count': 0, 'donors': [], 'next_after_id': None}), 200
         else:
-            donors = RecurringDonor.query.all()
-        
+            name_id = None
+
+        if request.args.get('count_only', '').lower() in ('1', 'true', 'yes'):
+            return jsonify({'status': 'success', 'count': count_recurring_donors(name_id)}), 200
+
+        try:
+            after_id = int(request.args.get('after_id', 0))
+            limit = int(request.args.get('limit', RECURRING_DONORS_PAGE_SIZE))
+        except ValueError:
+            return jsonify({'error': 'after_id and limit must be integers'}), 400
+        limit = max(1, min(limit, RECURRING_DONORS_MAX_PAGE_SIZE))
+
+        fields = [field.strip() for field in request.args.get('fields', '').split(',') if field.strip()]
+        columns = RecurringDonor.__table__.c
+        unknown = [field for field in fields if field not in columns]
+        if unknown:
+            return jsonify({'error': f'Unknown fields: {", ".join(unknown)}'}), 400
+
+        # Fetch one row more than the page, to know whether there is a next page
+        if fields:
+            selected = [columns.id] + [columns[field] for field in fields if field != 'id']
+            query = select(*selected)
+        else:
+            query = select(RecurringDonor)
+        query = query.where(RecurringDonor.id > after_id).order_by(RecurringDonor.id).limit(limit + 1)
+        if name_id is not None:
+            query = query.where(RecurringDonor.name_id == name_id)
+
+        if fields:
+            rows = db.session.execute(query).all()
+            has_more = len(rows) > limit
+            rows = rows[:limit]
+            donors = [{key: json_value(value) for key, value in row._mapping.items()} for row in rows]
+            last_id = rows[-1].id if rows else None
+        else:
+            records = db.session.execute(query).scalars().all()
+            has_more = len(records) > limit
+            records = records[:limit]
+            donors = [donor.to_dict() for donor in records]
+            last_id = records[-1].id if records else None
+
         return jsonify({
             'status': 'success',
             'count': len(donors),
-            'donors': [donor.to_dict() for donor in donors]
+            'donors': donors,
+            'next_after_id': last_id if has_more else None
         }), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/new-donors-today')
+# Rows fetched from the database per batch while streaming an export
+EXPORT_BATCH_SIZE = 1000
+
+@api.route('/api/recurring-donors/export', methods=['GET'])
+def export_recurring_donors():
+    """
+    Stream all recurring donors as NDJSON (default) or CSV, one flat object or line per donor.
+
+    Query parameters:
+      format      ndjson or csv
+      name_id     only donors with this name_id
+      start_from  only donors that started on or after this date (DD.MM.YYYY or YYYY-MM-DD)
+      start_to    only donors that started on or before this date
+    """
+    export_format = request.args.get('format', 'ndjson').lower()
+    if export_format not in ('ndjson', 'csv'):
+        return jsonify({'error': 'format must be ndjson or csv'}), 400
+
+    table = RecurringDonor.__table__
+    query = select(table).order_by(table.c.id).execution_options(yield_per=EXPORT_BATCH_SIZE)
+    try:
+        if request.args.get('name_id'):
+            query = query.where(table.c.name_id == int(request.args['name_id']))
+        if request.args.get('start_from'):
+            query = query.where(table.c.start_date >= parse_date(request.args['start_from']))
+        if request.args.get('start_to'):
+            query = query.where(table.c.start_date <= parse_date(request.args['start_to']))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    columns = [column.name for column in table.columns]
+
+    def generate():
+        result = db.session.execute(query)
+        if export_format == 'csv':
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(columns)
+            yield buffer.getvalue()
+            for rows in result.partitions():
+                buffer.seek(0)
+                buffer.truncate()
+                writer.writerows(rows)
+                yield buffer.getvalue()
+        else:
+            for rows in result.partitions():
+                yield ''.join(
+                    json.dumps({column: json_value(value) for column, value in zip(columns, row)}, ensure_ascii=False) + '\n'
+                    for row in rows
+                )
+
+    mimetype = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    response = current_app.response_class(stream_with_context(generate()), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename=recurring_donors.{export_format}'
+    return response
+
+def aggregate_donors_by_day(start_date, end_date):
+    """
+    Aggregate recurring donors per start day for the window start_date..end_date (inclusive)
+    in a single grouped query over the indexed start_date column.
+
+    A donor (name_id) is only counted once per day. Returns a dictionary keyed by date
+    with the total donor count and, for MI/FG donors only, the count, amount sum and
+    payment method and product breakdowns.
+    """
+    # Keep one row per donor and day; donors without a name_id are kept apart by their id
+    first_rows = (
+        select(func.min(RecurringDonor.id).label('id'))
+        .where(RecurringDonor.start_date.between(start_date, end_date))
+        .group_by(RecurringDonor.start_date,
+                  func.coalesce(RecurringDonor.name_id, -RecurringDonor.id))
+        .subquery()
+    )
+    
+    mi_fg = case((is_mi_fg_donor(), 1), else_=0)
+    rows = read_connection().execute(
+        select(RecurringDonor.start_date,
+               RecurringDonor.payment_method,
+               RecurringDonor.producttype_id,
+               mi_fg.label('mi_fg'),
+               func.count().label('n_donors'),
+               func.sum(RecurringDonor.amount).label('amount'))
+        .join(first_rows, RecurringDonor.id == first_rows.c.id)
+        .group_by(RecurringDonor.start_date,
+                  RecurringDonor.payment_method,
+                  RecurringDonor.producttype_id,
+                  mi_fg)
+    ).all()
+    
+    days = {}
+    for row in rows:
+        stats = days.setdefault(row.start_date, {
+            'count': 0,
+            'mi_fg_count': 0,
+            'mi_fg_amount': 0,
+            'payment_methods': {},
+            'products': {}
+        })
+        stats['count'] += row.n_donors
+        if row.mi_fg:
+            stats['mi_fg_count'] += row.n_donors
+            stats['mi_fg_amount'] += row.amount or 0
+            stats['payment_methods'][row.payment_method] = stats['payment_methods'].get(row.payment_method, 0) + row.n_donors
+            stats['products'][row.producttype_id] = stats['products'].get(row.producttype_id, 0) + row.n_donors
+    
+    return days
+
+def aggregate_year_totals(year):
+    """
+    Return the total amount of all MI/FG donors and the number of MI/FG donors
+    who started in the given year, read from the daily rollup.
+    """
+    started_this_year = DonorDailyRollup.date.between(datetime(year, 1, 1).date(),
+                                                      datetime(year, 12, 31).date())
+    row = read_connection().execute(
+        select(func.sum(DonorDailyRollup.amount).label('total_amount'),
+               func.sum(case((started_this_year, DonorDailyRollup.n_donors), else_=0)).label('donors_this_year'))
+        .where(DonorDailyRollup.mi_fg.is_(True))
+    ).one()
+    return row.total_amount or 0, row.donors_this_year or 0
+
+@api.route('/api/new-donors-today')
+@conditional_get
+@response_cache.cached
 def get_new_donors_today():
+    return jsonify(new_donors_today(report_year()))
+
+def new_donors_today(year):
     """
     Get statistics about new donors that started today based on the startdate column
     Also includes data for the last 14 days for the graph
     """
     today = datetime.now().date()
     
-    # Instead of using today's date, find the most recent date with donors
-    # First check the last 7 days to find a date with donors
-    recent_donors = []
-    recent_date = None
-    recent_date_str = None
+    # The window covers the 7 days searched for the most recent date with donors,
+    # the 30 days before that date for the average and the 15 days of the graph
+    days = aggregate_donors_by_day(today - timedelta(days=36), today)
+    empty_day = {'count': 0, 'mi_fg_count': 0, 'mi_fg_amount': 0, 'payment_methods': {}, 'products': {}}
     
-    # Try to find donors from the last 7 days
+    # Instead of using today's date, find the most recent date with donors in the last 7 days.
+    # If there are none, use today's date with 0 donors
+    recent_date = today
     for i in range(7):
         check_date = today - timedelta(days=i)
-        check_date_str = check_date.strftime('%d.%m.%Y')
-        
-        # Check both date formats
-        date_donors = RecurringDonor.query.filter_by(startdate=check_date).all()
-        string_donors = RecurringDonor.query.filter_by(startdato=check_date_str).all()
-        
-        # Combine donors from both date formats
-        combined_donors = list(set(date_donors + string_donors))
-        
-        if combined_donors:
-            recent_donors = combined_donors
+        if days.get(check_date, empty_day)['count']:
             recent_date = check_date
-            recent_date_str = check_date_str
-            print(f"Found {len(recent_donors)} donors for date {recent_date_str}")
             break
     
-    # If no donors found in the last 7 days, use today's date but with empty donors list
-    if not recent_donors:
-        recent_date = today
-        recent_date_str = today.strftime('%d.%m.%Y')
-        recent_donors = []
-        print(f"No donors found in the last 7 days. Using today's date with 0 donors.")
-    
-    # Use the recent donors as our "today's" donors
-    new_donors_today = recent_donors
-    
-    # Filter to only include MI and FG product types
-    new_donors_today = [donor for donor in new_donors_today 
-                        if hasattr(donor, 'produkttype') and donor.produkttype in ['MI', 'FG'] or 
-                           hasattr(donor, 'producttype_id') and donor.producttype_id in ['MI', 'FG']]
-    
-    # Calculate total value (no longer multiplying by 12) - ensure amount is available
-    yearly_value = sum(donor.amount for donor in new_donors_today if donor.amount is not None)
-    
-    # Get payment method breakdown
-    payment_methods = {}
-    for donor in new_donors_today:
-        method = donor.payment_method
-        payment_methods[method] = payment_methods.get(method, 0) + 1
-    
-    # Get product breakdown
-    products = {}
-    for donor in new_donors_today:
-        product = donor.producttype_id
-        products[product] = products.get(product, 0) + 1
-    
-    # Calculate the average of new donors for the last 30 days
-    # Use the recent date as reference
-    if recent_date:
-        reference_date = recent_date
-    else:
-        reference_date = today
-        
-    thirty_days_ago = reference_date - timedelta(days=30)
-    last_30_days_counts = []
-    
-    for i in range(30):
-        date = reference_date - timedelta(days=i + 1)  # Skip reference date
-        date_str = date.strftime('%d.%m.%Y')
-        
-        # Count donors with matching date field
-        date_count = RecurringDonor.query.filter_by(startdate=date).count()
-        
-        # Count donors with matching string date field
-        string_count = RecurringDonor.query.filter_by(startdato=date_str).count()
-        
-        # Add the total count for this date
-        total_count = date_count + string_count
-        last_30_days_counts.append(total_count)
+    # Only MI and FG product types count as new donors
+    recent_stats = days.get(recent_date, empty_day)
     
-    average_new_donors = round(sum(last_30_days_counts) / len(last_30_days_counts)) if last_30_days_counts else 0
+    # Calculate the average of new donors for the 30 days before the recent date
+    last_30_days_counts = [days.get(recent_date - timedelta(days=i + 1), empty_day)['count'] for i in range(30)]
+    average_new_donors = round(sum(last_30_days_counts) / len(last_30_days_counts))
     
-    # Get historical data for the last 14 days
-    # Use today's date as reference for the graph
-    reference_date = today
-    print(f"Debug - Today's date: {today}, Reference date for graph: {reference_date}")
-        
+    # Historical data for the last 14 days, using today's date as reference for the graph
     historical_data = []
-    print(f"Debug - Date range for graph:")
     for i in range(14, -1, -1):
-        date = reference_date - timedelta(days=i)
-        date_str = date.strftime('%d.%m.%Y')
-        print(f"Debug - Processing date: {date_str} ({i} days before reference date)")
-        
-        # Get donors with matching date field
-        date_donors = RecurringDonor.query.filter_by(startdate=date).all()
-        
-        # Get donors with matching string date field
-        string_donors = RecurringDonor.query.filter_by(startdato=date_str).all()
-        
-        # Combine donors from both date formats and remove duplicates based on name_id
-        all_donors = date_donors + string_donors
-        
-        # Create a dictionary with name_id as key to remove duplicates
-        unique_donors_dict = {}
-        for donor in all_donors:
-            if donor.name_id not in unique_donors_dict:
-                unique_donors_dict[donor.name_id] = donor
-        
-        # Convert back to list
-        donors_on_date = list(unique_donors_dict.values())
-        
-        # Debug output for May 17, 2025
-        if date_str == '17.05.2025':
-            print(f"Debug - May 17, 2025 - Date donors: {len(date_donors)}, String donors: {len(string_donors)}, Raw combined: {len(all_donors)}, After deduplication: {len(donors_on_date)}")
-            print(f"Debug - May 17, 2025 - Date format: {date}, String format: {date_str}")
-        
-        # Filter to only include MI and FG product types
-        donors_on_date = [donor for donor in donors_on_date 
-                          if hasattr(donor, 'produkttype') and donor.produkttype in ['MI', 'FG'] or 
-                             hasattr(donor, 'producttype_id') and donor.producttype_id in ['MI', 'FG']]
-        
-        # More debug for May 17, 2025
-        if date_str == '17.05.2025':
-            print(f"Debug - May 17, 2025 - After filtering: {len(donors_on_date)}")
-            # Check for duplicates in another way
-            name_ids = [donor.name_id for donor in donors_on_date if donor.name_id is not None]
-            print(f"Debug - May 17, 2025 - Unique name_ids: {len(set(name_ids))}, Total name_ids: {len(name_ids)}")
-        
-        # Calculate daily value - ensure amount is available
-        daily_value = sum(donor.amount for donor in donors_on_date if donor.amount is not None)
-        
-        # Format date as DD.MM
-        formatted_date = date.strftime('%d.%m')
-        
+        date = today - timedelta(days=i)
+        stats = days.get(date, empty_day)
         historical_data.append({
-            'date': formatted_date,
-            'count': len(donors_on_date),
-            'value': daily_value
+            'date': date.strftime('%d.%m'),
+            'count': stats['mi_fg_count'],
+            'value': stats['mi_fg_amount']
         })
     
-    # Reverse the data so it's in chronological order (oldest to newest)
+    # Keep the order the dashboards expect (newest first)
     historical_data.reverse()
     
-    # Calculate total value of all donors in the current year
-    current_year = today.year
-    start_of_year = datetime(current_year, 1, 1).date()
-    start_of_year_str = start_of_year.strftime('%d.%m.%Y')
-    
-    # Instead of filtering by date, get all donors to match the recurring_donors route logic
-    all_donors = RecurringDonor.query.all()
-    
-    # Filter to only include MI and FG product types
-    filtered_donors = [donor for donor in all_donors 
-                      if hasattr(donor, 'produkttype') and donor.produkttype in ['MI', 'FG'] or 
-                         hasattr(donor, 'producttype_id') and donor.producttype_id in ['MI', 'FG']]
-    
-    # Calculate total amount for all donors (matching the recurring_donors route logic)
-    total_yearly_amount = sum(donor.amount if donor.amount is not None else 0 for donor in filtered_donors)
-    
-    # Also calculate the number of donors this year for the API response
-    current_year_donors = [donor for donor in filtered_donors 
-                          if (donor.startdate and donor.startdate.year == current_year) or
-                             (donor.startdato and donor.startdato.endswith(str(current_year)))]
+    # Total amount of all donors and the number of donors this year
+    total_yearly_amount, donors_this_year_count = aggregate_year_totals(year)
     
-    return jsonify({
-        'count': len(new_donors_today),
-        'yearly_value': yearly_value,
+    return {
+        'count': recent_stats['mi_fg_count'],
+        'yearly_value': recent_stats['mi_fg_amount'],
         'average_new_donors_last_30_days': average_new_donors,
-        'payment_methods': payment_methods,
-        'products': products,
+        'payment_methods': recent_stats['payment_methods'],
+        'products': recent_stats['products'],
         'last_14_days': historical_data,
         'total_yearly_amount': total_yearly_amount,
-        'donors_this_year_count': len(current_year_donors)
-    })
+        'donors_this_year_count': donors_this_year_count
+    }
+
+def dashboard_version():
+    """Version of the dashboard data, which like the ETags also changes at midnight"""
+    return f'{get_data_version()[0]}-{datetime.now().date().isoformat()}'
+
+def new_donors_today_json():
+    return json.dumps(new_donors_today(current_app.config['REPORT_YEAR'] or datetime.now().year))
+
+# The poll interval is set from CHANGE_FEED_INTERVAL by create_app()
+change_feed = ChangeFeed(dashboard_version, new_donors_today_json)
+
+# Seconds between keep-alive comments on idle streams, and before a stream is closed
+# so the browser reconnects
+STREAM_HEARTBEAT = 15
+STREAM_DURATION = 600
+
+@api.route('/api/new-donors-today/stream')
+def stream_new_donors_today():
+    """
+    Server-Sent Events stream of the /api/new-donors-today data, sent on connect and
+    again whenever donors or donor statistics change. Each stream holds a connection
+    open, so gunicorn runs threaded workers (see gunicorn_config.py).
+    """
+    app = current_app._get_current_object()
+    last_event_id = request.headers.get('Last-Event-ID')
+    
+    def generate():
+        # Reconnect after 5 seconds if the connection is lost
+        yield 'retry: 5000\n\n'
+        for change in change_feed.listen(app, last_event_id, STREAM_HEARTBEAT, STREAM_DURATION):
+            if change is None:
+                yield ': keep-alive\n\n'
+            else:
+                version, payload = change
+                yield f'id: {version}\ndata: {payload}\n\n'
+    
+    response = current_app.response_class(generate(), mimetype='text/event-stream')
+    response.cache_control.no_cache = True
+    # Don't let proxies buffer the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
 
-# Create database tables if they don't exist
-with app.app_context():
+def init_db():
+    """
+    Create the missing database tables and fill the default county mapping.
+    Run once before the application starts (scripts/migrate_db.py, or python app.py),
+    not on every worker boot. Must be called inside an application context.
+    """
+    # Log system information
+    logger.info(f'Python version: {sys.version}')
+    logger.info(f'Platform: {sys.platform}')
+    logger.info(f'Current working directory: {os.getcwd()}')
+    
+    db_info = current_app.config['SQLALCHEMY_DATABASE_URI']
+    if db_info.startswith('sqlite'):
+        # Check if the database directory is writable
+        db_dir = os.path.dirname(db.engine.url.database or '') or '.'
+        if not os.access(db_dir, os.W_OK):
+            logger.error(f'Database directory is not writable: {db_dir}')
+    
+    current_app.logger.info('Creating database tables if they don\'t exist')
+    db.create_all()
+    if seed_county_mapping(db.session, CountyMapping.__table__):
+        db.session.commit()
+        current_app.logger.info('Filled county_mapping with the default county names')
+    
+    # Log success message with the database URI (but mask any sensitive information)
+    if db_info.startswith('sqlite'):
+        current_app.logger.info(f'Database tables created successfully at {db_info}')
+    else:
+        # For other database types, don't log the full connection string as it might contain credentials
+        db_type = db_info.split('://')[0] if '://' in db_info else 'unknown'
+        current_app.logger.info(f'Database tables created successfully using {db_type} database')
+
+def create_app(test_config=None):
+    """
+    Create and configure the application. test_config overrides the configuration
+    read from the environment.
+    """
+    app = Flask(__name__, instance_relative_config=True, static_folder='static', static_url_path='/static')
+    
+    # Make sure the instance folder exists. Checking that it and the database are usable is
+    # left to init_db(), which runs once before the workers start.
     try:
-        app.logger.info('Creating database tables if they don\'t exist')
-        # Ensure the instance directory exists and has proper permissions
         os.makedirs(app.instance_path, exist_ok=True)
-        # Create database tables
-        db.create_all()
-        # Log success message with the database URI (but mask any sensitive information)
-        db_info = app.config['SQLALCHEMY_DATABASE_URI']
-        if db_info.startswith('sqlite'):
-            app.logger.info(f'Database tables created successfully at {db_info}')
-        else:
-            # For other database types, don't log the full connection string as it might contain credentials
-            db_type = db_info.split('://')[0] if '://' in db_info else 'unknown'
-            app.logger.info(f'Database tables created successfully using {db_type} database')
     except Exception as e:
-        app.logger.error(f'Error creating database tables: {e}')
+        logger.error(f'Error creating instance path: {e}')
+    
+    configure_database(app)
+    app.config['TEMPLATES_AUTO_RELOAD'] = True
+    
+    # Seconds dashboard responses are served from the in-process cache, 0 disables caching
+    app.config['RESPONSE_CACHE_TTL'] = int(os.environ.get('RESPONSE_CACHE_TTL', 60))
+    
+    # Year reported on the dashboards, the current year when not set
+    app.config['REPORT_YEAR'] = int(os.environ['REPORT_YEAR']) if os.environ.get('REPORT_YEAR') else None
+    
+    # Group commits of the vendor POSTs: '' writes each request in its own transaction,
+    # 'sync' answers after the group commit and 'async' at once with 202 Accepted
+    app.config['WRITE_QUEUE'] = os.environ.get('WRITE_QUEUE', '').lower()
+    # A group commit waits up to WRITE_QUEUE_MAX_DELAY_MS for up to WRITE_QUEUE_MAX_BATCH records
+    app.config['WRITE_QUEUE_MAX_DELAY_MS'] = int(os.environ.get('WRITE_QUEUE_MAX_DELAY_MS', 10))
+    app.config['WRITE_QUEUE_MAX_BATCH'] = int(os.environ.get('WRITE_QUEUE_MAX_BATCH', 100))
+    
+    # Seconds between the checks for changes pushed to the dashboard streams
+    app.config['CHANGE_FEED_INTERVAL'] = float(os.environ.get('CHANGE_FEED_INTERVAL', 2))
+    
+    if test_config:
+        app.config.update(test_config)
+    
+    app.template_folder = os.path.abspath('templates')
+    db.init_app(app)
+    response_cache.ttl = app.config['RESPONSE_CACHE_TTL']
+    primary_response_cache.ttl = app.config['RESPONSE_CACHE_TTL']
+    change_feed.interval = app.config['CHANGE_FEED_INTERVAL']
+    write_queue.max_delay = app.config['WRITE_QUEUE_MAX_DELAY_MS'] / 1000
+    write_queue.max_batch = app.config['WRITE_QUEUE_MAX_BATCH']
+    
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name == 'sqlite':
+                event.listen(engine, 'connect', sqlite_pragma_listener(app.config['SQLITE_PRAGMAS']))
+    
+    app.url_defaults(add_static_fingerprint)
+    app.after_request(add_header)
+    app.teardown_appcontext(close_read_connection)
+    
+    app.register_blueprint(dashboard)
+    app.register_blueprint(imports)
+    app.register_blueprint(api)
+    return app
+
+# The application for gunicorn (app:app, wsgi:application) and the scripts
+app = create_app()
 
 if __name__ == '__main__':
+    with app.app_context():
+        init_db()
+        fail_interrupted_import_jobs()
     # Get port from environment variable or use default 5000
     port = int(os.environ.get('PORT', 8000))
     # Use the specific IP address or 0.0.0.0 to listen on all interfaces
@@ -24,12 +24,27 @@ class Config:
     
     # Template configuration
     TEMPLATES_AUTO_RELOAD = True
+    
+    # Pragmas applied to every new SQLite connection (ignored on other databases).
+    # WAL lets the dashboards read while an import writes; it needs a local filesystem.
+    # busy_timeout is how long (ms) a connection retries before failing with "database is locked".
+    # The page cache is per connection, and every gunicorn thread can hold one, so keep it
+    # small on the Raspberry Pi; raise it with SQLITE_CACHE_SIZE_KB on a larger server.
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -int(os.environ.get('SQLITE_CACHE_SIZE_KB', 16000)),  # 16 MB per connection
+        'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 67108864)),  # 64 MB
+        'busy_timeout': 30000,
+        'temp_store': 'MEMORY'
+    }
 
 class DevelopmentConfig(Config):
     DEBUG = True
 
 class ProductionConfig(Config):
     DEBUG = False
+    SQLITE_PRAGMAS = dict(Config.SQLITE_PRAGMAS, busy_timeout=60000)
 
 # Choose configuration based on environment
 config = {
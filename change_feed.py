@@ -0,0 +1,76 @@
+import threading
+
+class ChangeFeed:
+    """
+    Push channel for dashboards kept open with Server-Sent Events.
+
+    While streams are connected, one thread per worker polls get_version (a single-row
+    read) and only when the version changed builds the payload, once, and wakes every
+    connected stream. notify() wakes the thread right away after a write in this worker;
+    writes in other gunicorn workers are picked up within the poll interval.
+    """
+
+    def __init__(self, get_version, build_payload, interval=2.0):
+        self.get_version = get_version
+        self.build_payload = build_payload
+        self.interval = interval
+        self.version = None
+        self.payload = None
+        self.listeners = 0
+        self._thread = None
+        self._lock = threading.Lock()
+        self._changed = threading.Condition()
+        self._wake = threading.Event()
+
+    def notify(self):
+        """Check for a change now instead of at the next poll"""
+        self._wake.set()
+
+    def listen(self, app, version=None, heartbeat=15, duration=600):
+        """
+        Yield (version, payload) for the current data unless the client has version, then
+        again on every change. Yields None as a heartbeat when nothing changed for heartbeat
+        seconds, and stops after duration seconds so clients reconnect now and then.
+        """
+        self._add_listener(app)
+        try:
+            for _ in range(max(1, int(duration // heartbeat))):
+                with self._changed:
+                    changed = self._changed.wait_for(
+                        lambda: self.payload is not None and self.version != version, heartbeat)
+                    if changed:
+                        version = self.version
+                        change = (self.version, self.payload)
+                yield change if changed else None
+        finally:
+            with self._lock:
+                self.listeners -= 1
+
+    def _add_listener(self, app):
+        with self._lock:
+            self.listeners += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, args=(app,), name='change-feed', daemon=True)
+                self._thread.start()
+
+    def _run(self, app):
+        while True:
+            with self._lock:
+                if not self.listeners:
+                    # Nobody listens: stop polling, and forget the payload as it goes stale
+                    self._thread = None
+                    with self._changed:
+                        self.version = self.payload = None
+                    return
+            self._wake.clear()
+            try:
+                with app.app_context():
+                    version = self.get_version()
+                    if version != self.version:
+                        payload = self.build_payload()
+                        with self._changed:
+                            self.version, self.payload = version, payload
+                            self._changed.notify_all()
+            except Exception:
+                app.logger.exception('Could not refresh the dashboard change feed')
+            self._wake.wait(self.interval)
@@ -0,0 +1,19 @@
+from sqlalchemy import select, func
+
+def non_empty(column):
+    """SQL condition matching columns that are neither NULL nor an empty string"""
+    return column.isnot(None) & (column != '')
+
+def donors_per_project(connection, donors):
+    """
+    Count the donors and sum their belop per project (prosjektnavn), largest first.
+    connection is a Session or Connection of the shared engine, donors the recurring_donor table.
+    Returns rows of (prosjektnavn, count, total_amount).
+    """
+    count = func.count().label('count')
+    return connection.execute(
+        select(donors.c.prosjektnavn, count, func.sum(donors.c.belop).label('total_amount'))
+        .where(non_empty(donors.c.prosjektnavn))
+        .group_by(donors.c.prosjektnavn)
+        .order_by(count.desc())
+    ).all()
@@ -0,0 +1,213 @@
+import logging
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+
+logger = logging.getLogger(__name__)
+
+# The Excel columns we import (non-personal information only), mapped to RecurringDonor fields
+FIELD_MAPPING = {
+    'Navnenr': 'navnenr',
+    'Register': 'register',
+    'Register.1': 'register_1',
+    'Avtalenummer': 'avtalenummer',
+    'Postnummer': 'postnummer',
+    'Poststed': 'poststed',
+    'Kommune': 'kommune',
+    'Fylke': 'fylke',
+    'Landkode': 'landkode',
+    'Land': 'land',
+    'Navnetype': 'navnetype',
+    'Fødselsår/startår': 'fodselsaar_startaar',
+    'Produktkode': 'produktkode',
+    'Produkttype': 'produkttype',
+    'Prosjektnummer': 'prosjektnummer',
+    'Produkt': 'produkt',
+    'Prosjektnavn': 'prosjektnavn',
+    'Startdato': 'startdato',
+    'Betalingsmåte': 'betalingsmaate',
+    'Girorytme': 'girorytme',
+    'Betalingsrytme': 'betalingsrytme',
+    'Beløp': 'belop',
+    'Aksjonstype': 'aksjonstype',
+    'Aksjonstype beskrivelse': 'aksjonstype_beskrivelse',
+    'Aksjonsnummer': 'aksjonsnummer',
+    'Aksjonsnavn': 'aksjonsnavn',
+    'Avtaletype': 'avtaletype',
+    'Periode beløp': 'periode_belop',
+    'Opprettet dato': 'opprettet_dato'
+}
+
+ALLOWED_COLUMNS = list(FIELD_MAPPING)
+
+# Legacy fields populated from the same Excel columns for backward compatibility
+LEGACY_FIELD_MAPPING = {
+    'Navnenr': 'name_id',
+    'Avtalenummer': 'agreement_number',
+    'Postnummer': 'zip_code',
+    'Landkode': 'country_id',
+    'Navnetype': 'nametype_id',
+    'Produkttype': 'producttype_id',
+    'Prosjektnummer': 'project_id',
+    'Beløp': 'amount',
+    'Betalingsrytme': 'interval',
+    'Startdato': 'startdate',
+    'Betalingsmåte': 'payment_method'
+}
+
+INTEGER_FIELDS = ['navnenr', 'prosjektnummer', 'girorytme', 'name_id', 'project_id']
+FLOAT_FIELDS = ['belop', 'periode_belop', 'amount']
+
+# Only these product types are imported
+IMPORTED_PRODUCT_TYPES = ['MI', 'FG']
+
+def excel_header(cells):
+    """Name the columns of a header row the way pandas.read_excel does ('Register', 'Register.1')"""
+    header = []
+    seen = {}
+    for position, cell in enumerate(cells):
+        name = str(cell) if cell is not None else f'Unnamed: {position}'
+        if name in seen:
+            seen[name] += 1
+            name = f'{name}.{seen[name]}'
+        else:
+            seen[name] = 0
+        header.append(name)
+    return header
+
+def excel_row_count(filepath):
+    """Estimate the number of data rows in the first sheet without reading it, None if unknown"""
+    if not filepath.endswith('.xlsx'):
+        return None
+    workbook = load_workbook(filepath, read_only=True)
+    try:
+        max_row = workbook.worksheets[0].max_row
+        return max_row - 1 if max_row else None
+    finally:
+        workbook.close()
+
+def read_excel_chunks(filepath, chunk_size):
+    """
+    Read the first sheet of an Excel file as DataFrames of at most chunk_size rows.
+
+    .xlsx files are streamed with a read-only openpyxl iterator, so only one chunk is held
+    in memory at a time. Other formats are read in one go with pandas.read_excel.
+    Cells keep the type Excel stored them with, so text like '0150' is not read as a number.
+    """
+    if not filepath.endswith('.xlsx'):
+        yield pd.read_excel(filepath, dtype=object)
+        return
+
+    workbook = load_workbook(filepath, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = excel_header(next(rows, ()))
+        width = len(header)
+
+        chunk = []
+        for row in rows:
+            # Skip empty rows, and pad or cut rows to the width of the header
+            if all(value is None for value in row):
+                continue
+            chunk.append(tuple(row[:width]) + (None,) * (width - len(row)))
+            if len(chunk) == chunk_size:
+                yield pd.DataFrame.from_records(chunk, columns=header)
+                chunk = []
+        if chunk:
+            yield pd.DataFrame.from_records(chunk, columns=header)
+    finally:
+        workbook.close()
+
+def filter_donor_frame(df):
+    """Keep only the allowed columns, and only the rows where Produkttype is MI or FG"""
+    df_filtered = df[[column for column in df.columns if column in FIELD_MAPPING]]
+
+    if 'Produkttype' in df_filtered.columns:
+        logger.info(f"Before filtering by Produkttype: {len(df_filtered)} records")
+        df_filtered = df_filtered[df_filtered['Produkttype'].isin(IMPORTED_PRODUCT_TYPES)]
+        logger.info(f"After filtering by Produkttype: {len(df_filtered)} records")
+
+    return df_filtered
+
+def to_integer(column):
+    """Convert a column to whole numbers, unparseable values become missing"""
+    return np.trunc(pd.to_numeric(column, errors='coerce')).astype('Int64')
+
+def to_float(column):
+    """Convert a column to floats, unparseable values become missing"""
+    return pd.to_numeric(column, errors='coerce').astype('float64')
+
+def to_text(column):
+    """Convert a column to strings the way str() formats each cell, missing values stay missing"""
+    if pd.api.types.is_datetime64_any_dtype(column):
+        text = column.dt.strftime('%Y-%m-%d %H:%M:%S')
+    elif pd.api.types.is_float_dtype(column):
+        # Whole numbers are written as they appear in Excel ('1234', not '1234.0'), so the text
+        # doesn't depend on whether the column, or the chunk of it, has empty cells
+        whole = (column == np.floor(column)) & (column.abs() < 2 ** 53)
+        text = column.astype(str).mask(whole, column.where(whole).astype('Int64').astype(str))
+    else:
+        text = column.astype(str)
+    return text.where(column.notna())
+
+def to_start_date(column):
+    """
+    Parse Startdato cells to dates. Strings are read as DD.MM.YYYY or YYYY-MM-DD,
+    cells Excel already stored as dates are used as they are.
+    """
+    if pd.api.types.is_datetime64_any_dtype(column):
+        return column.dt.normalize()
+
+    text = to_text(column).str.strip()
+    dotted = pd.to_datetime(text.where(text.str.contains('.', regex=False)), format='%d.%m.%Y', errors='coerce')
+    iso = pd.to_datetime(text.str.slice(0, 10), format='%Y-%m-%d', errors='coerce')
+    return dotted.fillna(iso)
+
+def convert_donor_frame(df):
+    """
+    Convert a filtered Excel export to a frame of RecurringDonor fields, one column at a time.
+
+    Numeric fields are coerced with to_numeric, other fields become strings, and the legacy
+    fields are derived from the same Excel columns. Dates written as DD.MM.YYYY are stored in
+    startdate only. Missing or unparseable values are None.
+    """
+    donors = pd.DataFrame(index=df.index)
+
+    for column, field_name in FIELD_MAPPING.items():
+        if column not in df.columns:
+            continue
+        if field_name in INTEGER_FIELDS:
+            donors[field_name] = to_integer(df[column])
+        elif field_name in FLOAT_FIELDS:
+            donors[field_name] = to_float(df[column])
+        else:
+            donors[field_name] = to_text(df[column])
+
+    # .xls files are read with dtype=object, so whole-number agreement numbers arrive as floats
+    # ('12.0'); store them as .xlsx files give them ('12'), like normalize_agreement_number in app.py
+    if 'avtalenummer' in donors.columns:
+        donors['avtalenummer'] = donors['avtalenummer'].str.replace(r'^(\d+)\.0$', r'\1', regex=True)
+
+    for column, legacy_field in LEGACY_FIELD_MAPPING.items():
+        if column not in df.columns:
+            continue
+        if legacy_field == 'startdate':
+            startdate = to_start_date(df[column])
+            donors[legacy_field] = startdate.dt.date.where(startdate.notna())
+            # Store dates given as DD.MM.YYYY only in the date field, not as a string
+            dotted = startdate.notna() & donors['startdato'].str.contains('.', regex=False).fillna(False)
+            donors['startdato'] = donors['startdato'].mask(dotted)
+        else:
+            field_name = FIELD_MAPPING[column]
+            donors[legacy_field] = donors[field_name]
+
+    donors['campaign_id'] = np.random.randint(1, 11, size=len(donors))
+    donors['classification_id_success'] = 'S1'
+
+    # Use None for missing values so the frame can be written to the database as it is
+    return donors.astype(object).where(donors.notna(), None)
+
+def donor_records(donors):
+    """Return the rows of a converted donor frame as a list of dictionaries"""
+    return donors.to_dict('records')
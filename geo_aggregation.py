@@ -0,0 +1,74 @@
+from sqlalchemy import select, insert, func
+
+from donor_queries import non_empty
+
+# Default county_mapping rows: fylke names in the donor data mapped to the current
+# Norwegian counties (2024). Fylke names without a row are shown as they are.
+COUNTY_MAPPING = {
+    'Oslo': 'Oslo',
+    'Rogaland': 'Rogaland',
+    'Møre og Romsdal': 'Møre og Romsdal',
+    'Nordland': 'Nordland',
+    'Trøndelag': 'Trøndelag',
+    'Troms og Finnmark': 'Troms og Finnmark',
+    'Vestland': 'Vestland',
+    'Agder': 'Agder',
+    'Innlandet': 'Innlandet',
+    'Vestfold og Telemark': 'Vestfold og Telemark',
+    'Viken': 'Viken',
+    # Map old county names to new ones
+    'Akershus': 'Viken',
+    'Buskerud': 'Viken',
+    'Østfold': 'Viken',
+    'Vestfold': 'Vestfold og Telemark',
+    'Telemark': 'Vestfold og Telemark',
+    'Oppland': 'Innlandet',
+    'Hedmark': 'Innlandet',
+    'Aust-Agder': 'Agder',
+    'Vest-Agder': 'Agder',
+    'Hordaland': 'Vestland',
+    'Sogn og Fjordane': 'Vestland',
+    'Troms': 'Troms og Finnmark',
+    'Finnmark': 'Troms og Finnmark'
+}
+
+# Areas donors can be aggregated by: the mapped county, or the raw kommune or postnummer
+AREA_LEVELS = ['fylke', 'kommune', 'postnummer']
+
+def seed_county_mapping(connection, counties):
+    """Fill an empty county_mapping table with COUNTY_MAPPING, returns the number of rows added"""
+    if connection.execute(select(func.count()).select_from(counties)).scalar():
+        return 0
+    connection.execute(insert(counties), [{'fylke': fylke, 'county': county}
+                                          for fylke, county in COUNTY_MAPPING.items()])
+    return len(COUNTY_MAPPING)
+
+def donors_per_area_query(donors, counties, level='fylke'):
+    """
+    Build the query counting the donors per area, largest first.
+    For level 'fylke' old county names are mapped to the current county through the
+    county_mapping table; 'kommune' and 'postnummer' are grouped as they are.
+    """
+    if level == 'fylke':
+        area = func.coalesce(counties.c.county, donors.c.fylke)
+        source = donors.outerjoin(counties, counties.c.fylke == donors.c.fylke)
+        condition = non_empty(donors.c.fylke)
+    else:
+        area = donors.c[level]
+        source = donors
+        condition = non_empty(area)
+
+    area = area.label('area')
+    count = func.count().label('count')
+    return (
+        select(area, count)
+        .select_from(source)
+        .where(condition)
+        .group_by(area)
+        .order_by(count.desc(), area)
+    )
+
+def donors_per_area(connection, donors, counties, level='fylke'):
+    """Count the donors per area in a single query, returns a list of (area, count)"""
+    rows = connection.execute(donors_per_area_query(donors, counties, level)).all()
+    return [(row.area, row.count) for row in rows]
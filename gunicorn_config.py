@@ -1,5 +1,6 @@
 # Gunicorn configuration file for Azure App Service deployment
 import multiprocessing
+import os
 
 # Bind to 0.0.0.0:8000
 bind = "0.0.0.0:8000"
@@ -7,8 +8,13 @@ bind = "0.0.0.0:8000"
 # Number of worker processes
 workers = multiprocessing.cpu_count() * 2 + 1
 
-# Worker class
-worker_class = "sync"
+# Worker class. The dashboards keep a Server-Sent Events stream open
+# (/api/new-donors-today/stream), which would take a sync worker for as long as it is
+# open. Threaded workers hold a stream per thread, waiting idle until the data changes.
+worker_class = "gthread"
+
+# Threads per worker, the number of requests and open streams each worker can handle
+threads = int(os.environ.get("GUNICORN_THREADS", 50))
 
 # Timeout in seconds
 timeout = 600
@@ -24,3 +30,17 @@ errorlog = "-"
 
 # Application module
 app_module = "app:app"
+
+# Import the application once in the master process, before the workers are forked.
+# The workers then share the imported modules copy-on-write instead of each importing
+# them again, which makes them boot faster and use less memory.
+preload_app = True
+
+def post_fork(server, worker):
+    # Connections opened in the master must not be shared with the forked workers:
+    # drop the inherited pools, without closing the master's connections, so each
+    # worker opens its own connections.
+    from app import app, db
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
@@ -1,4 +1,4 @@
-from app import app, db, RecurringDonor
+from app import app, db, RecurringDonor, init_db, rebuild_donor_rollup
 from datetime import datetime, timedelta
 import random
 
@@ -33,7 +33,6 @@ def create_donor(startdate, payment_method=None, product_type=None, amount=None)
         agreement_number=agreement_number,
         producttype_id=product_type,
         project_id=random.randint(1, 5),
-        productvariant_id=random.randint(1, 3),
         amount=amount,
         interval=random.choice(intervals),
         startdate=startdate
@@ -44,9 +43,12 @@ def create_donor(startdate, payment_method=None, product_type=None, amount=None)
 def populate_database():
     """Populate the database with test data"""
     with app.app_context():
+        init_db()
+        
         # Clear existing data
         db.session.query(RecurringDonor).delete()
         db.session.commit()
+        rebuild_donor_rollup()
         
         # Get today's date
         today = datetime.now().date()
@@ -0,0 +1,123 @@
+import threading
+import time
+from datetime import datetime, time as day_start
+from functools import wraps
+
+from flask import request, current_app
+
+class ResponseCache:
+    """
+    In-process cache of rendered GET responses with a time to live.
+
+    Dashboard routes are polled far more often than the data changes, so a cached
+    response is served until it expires or the data changes. If get_version is given,
+    entries are keyed by the current data version, so a write in any gunicorn worker
+    retires the cached responses of all workers.
+
+    Keys that are tuples start with the data version. Setting an entry of a newer version
+    drops the entries of older versions, and entries of an older version are not stored.
+    At most max_entries are kept: when full, the expired entries are dropped, then the oldest.
+    """
+
+    def __init__(self, ttl, get_version=None, max_entries=1000):
+        self.ttl = ttl
+        self.get_version = get_version
+        self.max_entries = max_entries
+        self._entries = {}
+        self._version = None
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            return value
+
+    def set(self, key, value):
+        now = time.monotonic()
+        with self._lock:
+            if isinstance(key, tuple) and key[0] != self._version:
+                if self._version is not None and key[0] < self._version:
+                    # A request that read the version before a write finished; already stale
+                    return
+                # Versions only go up, so the entries of older versions are stale
+                self._version = key[0]
+                self._entries = {k: entry for k, entry in self._entries.items()
+                                 if isinstance(k, tuple) and k[0] == self._version}
+            if key not in self._entries and len(self._entries) >= self.max_entries:
+                self._entries = {k: entry for k, entry in self._entries.items() if entry[0] >= now}
+                # Still full: drop the oldest entries, dicts keep the order they were set in
+                for k in list(self._entries)[:len(self._entries) - self.max_entries + 1]:
+                    del self._entries[k]
+            self._entries[key] = (now + self.ttl, value)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def cached(self, view):
+        """Decorator caching the successful responses of a view, keyed by path and query string"""
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if self.ttl <= 0 or request.method != 'GET':
+                return view(*args, **kwargs)
+
+            key = request.full_path
+            if self.get_version:
+                key = (self.get_version()[0], key)
+            entry = self.get(key)
+            if entry is None:
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code != 200 or response.is_streamed:
+                    return response
+                entry = (response.get_data(), response.status_code, list(response.headers.items()))
+                self.set(key, entry)
+
+            body, status, headers = entry
+            return current_app.response_class(body, status, headers)
+        return wrapper
+
+def conditional(get_version):
+    """
+    Decorator answering conditional GET requests with 304 Not Modified while the data
+    is unchanged, without running the view.
+
+    get_version returns the current (version, modified datetime) of the data. The ETag
+    and Last-Modified also change at midnight, as the dashboards report on the current day.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != 'GET':
+                return view(*args, **kwargs)
+
+            version, modified = get_version()
+            today = datetime.now().date()
+            etag = f'{version}-{today.isoformat()}'
+            last_modified = max(modified, datetime.combine(today, day_start.min))
+
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains(etag)
+            else:
+                since = request.if_modified_since
+                not_modified = since is not None and since.replace(tzinfo=None) >= last_modified.replace(microsecond=0)
+
+            if not_modified:
+                response = current_app.response_class(status=304)
+            else:
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag)
+            response.last_modified = last_modified
+            # Clients may keep the response but must revalidate it on every poll
+            response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
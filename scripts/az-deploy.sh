@@ -77,7 +77,7 @@ fi
 
 # Update the web app configuration
 print_status "Updating web app configuration..."
-az webapp config set --name "$APP_NAME" --resource-group "$RESOURCE_GROUP" --startup-file "gunicorn --bind=0.0.0.0:8000 --timeout 600 wsgi:application" --linux-fx-version "PYTHON|3.13"
+az webapp config set --name "$APP_NAME" --resource-group "$RESOURCE_GROUP" --startup-file "python scripts/migrate_db.py && gunicorn -c gunicorn_config.py wsgi:application" --linux-fx-version "PYTHON|3.13"
 
 if [ $? -ne 0 ]; then
     print_error "Failed to update web app configuration. Please check the error message above."
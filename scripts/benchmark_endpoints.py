@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+Script to benchmark the dashboard and API routes at several database sizes.
+For each size a SQLite database is seeded with scripts/generate_donors.py (and kept
+for the next run), and every route is driven through the Flask test client with the
+response caches disabled. Latency percentiles, the number of SQL statements per
+request and the peak Python memory of a request are compared with a stored baseline;
+the script exits with status 1 if a route regressed beyond the threshold.
+
+    python scripts/benchmark_endpoints.py --sizes 1000,100000
+    python scripts/benchmark_endpoints.py --update-baseline
+
+Timings depend on the machine, so record the baseline on the machine that runs the
+comparison. Statement counts don't, and are compared exactly.
+"""
+import sys
+import os
+import argparse
+import json
+import platform
+import shutil
+import subprocess
+import time
+import tracemalloc
+from contextlib import nullcontext
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Add parent directory to path so we can import from app
+sys.path.append(ROOT)
+
+import app as app_module
+from app import create_app, db, ImportJob
+from sqlalchemy import event, select, func
+
+DEFAULT_BASELINE = os.path.join(ROOT, 'scripts', 'benchmark_baseline.json')
+DEFAULT_DB_DIR = os.path.join(ROOT, 'instance', 'benchmark')
+
+# The routes benchmarked with GET requests
+ROUTES = [
+    '/api/new-donors-today',
+    '/report-5',
+    '/recurring-donors',
+    '/api/recurring-donors',
+    '/region',
+    '/kart',
+]
+
+IMPORT_ROUTE = 'POST /import-excel'
+
+# name_ids of the import fixture, far above those of the seeded donors so it adds new donors
+IMPORT_FIRST_NAME_ID = 90000000
+
+def sqlite_uri(path):
+    return f'sqlite:///{path}'
+
+def generate_donors(arguments, database=None):
+    """Run scripts/generate_donors.py in a subprocess, on the given SQLite database"""
+    env = dict(os.environ)
+    if database:
+        env['DATABASE_URL'] = sqlite_uri(database)
+    subprocess.run([sys.executable, os.path.join(ROOT, 'scripts', 'generate_donors.py')] + arguments,
+                   cwd=ROOT, env=env, check=True, stdout=subprocess.DEVNULL)
+
+def seeded_database(args, size):
+    """Path of the database seeded with size rows, seeding it if it doesn't exist yet"""
+    path = os.path.join(args.db_dir, f'donors_{size}_seed{args.seed}.db')
+    if args.reseed or not os.path.exists(path):
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        print(f"Seeding {path} with {size} rows...")
+        generate_donors(['--rows', str(size), '--seed', str(args.seed), '--first-name-id', '10000000'], path)
+    return path
+
+def import_fixture(args):
+    """Path of the .xlsx fixture of the import benchmark, writing it if it doesn't exist yet"""
+    path = os.path.join(args.db_dir, f'import_{args.import_rows}_seed{args.seed}.xlsx')
+    if args.reseed or not os.path.exists(path):
+        print(f"Writing {path} with {args.import_rows} rows...")
+        generate_donors(['--rows', str(args.import_rows), '--seed', str(args.seed),
+                         '--first-name-id', str(IMPORT_FIRST_NAME_ID), '--xlsx', path])
+    return path
+
+def benchmark_app(database):
+    """An application on the given database, with the response caches disabled"""
+    return create_app({
+        'SQLALCHEMY_DATABASE_URI': sqlite_uri(database),
+        'SQLALCHEMY_BINDS': {},
+        'RESPONSE_CACHE_TTL': 0,
+        'WRITE_QUEUE': '',
+    })
+
+class StatementCounter:
+    """Counts the SQL statements executed on the engines of an application"""
+
+    def __init__(self, app):
+        with app.app_context():
+            self.engines = list(db.engines.values())
+        self.count = 0
+
+    def __enter__(self):
+        for engine in self.engines:
+            event.listen(engine, 'before_cursor_execute', self.increment)
+        return self
+
+    def __exit__(self, *exc_info):
+        for engine in self.engines:
+            event.remove(engine, 'before_cursor_execute', self.increment)
+
+    def increment(self, *args):
+        self.count += 1
+
+def percentile(values, percent):
+    """Nearest-rank percentile of a list of values"""
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, round(percent / 100 * len(ordered)) - 1))]
+
+def summarize(timings, statements, peak_bytes):
+    return {
+        'p50_ms': round(percentile(timings, 50) * 1000, 2),
+        'p95_ms': round(percentile(timings, 95) * 1000, 2),
+        'p99_ms': round(percentile(timings, 99) * 1000, 2),
+        'queries': max(statements),
+        'peak_kb': round(peak_bytes / 1024),
+    }
+
+def clear_caches():
+    app_module.response_cache.clear()
+    app_module.primary_response_cache.clear()
+    app_module.aggregate_cache.clear()
+
+def traced_peak(run):
+    """Peak Python memory allocated while running run(), in bytes"""
+    tracemalloc.start()
+    try:
+        run()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def benchmark_route(app, client, route, requests):
+    """Time a GET route, count its statements and measure its peak memory"""
+    def get():
+        clear_caches()
+        response = client.get(route)
+        if response.status_code != 200:
+            raise RuntimeError(f'{route} returned {response.status_code}')
+        return response
+
+    # The first request also fills the connection pool and lazy imports
+    get()
+    timings = []
+    statements = []
+    counter = StatementCounter(app)
+    for _ in range(requests):
+        with counter:
+            counter.count = 0
+            start = time.perf_counter()
+            get()
+            timings.append(time.perf_counter() - start)
+        statements.append(counter.count)
+    return summarize(timings, statements, traced_peak(get))
+
+def benchmark_import(args, database, fixture):
+    """
+    Time the upload and background import of the .xlsx fixture until the job is done.
+    Every run imports into a fresh copy of the database, so each adds the same donors.
+    """
+    scratch = database + '.import.db'
+
+    def run_import(count_statements=False):
+        shutil.copyfile(database, scratch)
+        app = benchmark_app(scratch)
+        client = app.test_client()
+        counter = StatementCounter(app)
+        try:
+            with counter if count_statements else nullcontext():
+                start = time.perf_counter()
+                with open(fixture, 'rb') as f:
+                    response = client.post('/import-excel', data={'file': (f, os.path.basename(fixture))},
+                                           content_type='multipart/form-data')
+                if response.status_code != 202:
+                    raise RuntimeError(f'/import-excel returned {response.status_code}')
+                # Imports run one at a time, so the job is done when a task queued after it runs
+                app_module.import_executor.submit(lambda: None).result()
+                elapsed = time.perf_counter() - start
+            with app.app_context():
+                job = db.session.get(ImportJob, response.get_json()['job_id'])
+                if job.status != 'completed':
+                    raise RuntimeError(f'Import job {job.status}: {job.errors}')
+            return elapsed, counter.count
+        finally:
+            with app.app_context():
+                for engine in db.engines.values():
+                    engine.dispose()
+            os.remove(scratch)
+
+    # The first import also loads pandas
+    run_import()
+    timings = []
+    statements = []
+    for _ in range(args.import_runs):
+        elapsed, count = run_import(count_statements=True)
+        timings.append(elapsed)
+        statements.append(count)
+    return summarize(timings, statements, traced_peak(run_import))
+
+def benchmark_size(args, size):
+    database = seeded_database(args, size)
+    app = benchmark_app(database)
+    client = app.test_client()
+    with app.app_context():
+        donors = db.session.execute(select(func.count()).select_from(app_module.RecurringDonor)).scalar()
+    print(f"\n{size} rows ({donors} donors): {database}")
+
+    results = {}
+    for route in ROUTES:
+        results[route] = benchmark_route(app, client, route, args.requests)
+        print_result(route, results[route])
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
+
+    if args.import_rows:
+        # Keyed by the fixture size too, so imports of other sizes are not compared
+        route = f'{IMPORT_ROUTE} ({args.import_rows} rows)'
+        results[route] = benchmark_import(args, database, import_fixture(args))
+        print_result(route, results[route])
+    return results
+
+def print_result(route, result):
+    print(f"  {route:40} p50 {result['p50_ms']:9.2f} ms  p95 {result['p95_ms']:9.2f} ms  "
+          f"p99 {result['p99_ms']:9.2f} ms  {result['queries']:5} queries  {result['peak_kb']:7} KB peak")
+
+def regressions(results, baseline, threshold, min_delta_ms, min_delta_kb):
+    """Compare the results with the baseline, returns a list of regression messages"""
+    found = []
+    for size, routes in results.items():
+        for route, result in routes.items():
+            base = baseline.get(size, {}).get(route)
+            if not base:
+                continue
+            if (result['p95_ms'] > base['p95_ms'] * (1 + threshold)
+                    and result['p95_ms'] - base['p95_ms'] > min_delta_ms):
+                found.append(f"{route} at {size} rows: p95 {result['p95_ms']:.2f} ms, baseline {base['p95_ms']:.2f} ms")
+            if result['queries'] > base['queries']:
+                found.append(f"{route} at {size} rows: {result['queries']} queries, baseline {base['queries']}")
+            if (result['peak_kb'] > base['peak_kb'] * (1 + threshold)
+                    and result['peak_kb'] - base['peak_kb'] > min_delta_kb):
+                found.append(f"{route} at {size} rows: peak {result['peak_kb']} KB, baseline {base['peak_kb']} KB")
+    return found
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the routes at several database sizes against a baseline')
+    parser.add_argument('--sizes', default='1000,100000,1000000',
+                        help='Comma-separated numbers of generated rows to seed (default: 1000,100000,1000000)')
+    parser.add_argument('--requests', type=int, default=20, help='Timed requests per route (default: 20)')
+    parser.add_argument('--import-rows', type=int, default=5000,
+                        help='Rows of the .xlsx fixture of the import benchmark, 0 skips it (default: 5000)')
+    parser.add_argument('--import-runs', type=int, default=3, help='Timed imports per size (default: 3)')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed of the generated data (default: 1)')
+    parser.add_argument('--db-dir', default=DEFAULT_DB_DIR,
+                        help='Directory of the seeded databases, which are reused between runs (default: instance/benchmark)')
+    parser.add_argument('--reseed', action='store_true', help='Seed the databases and the fixture again')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE,
+                        help='Baseline JSON file (default: scripts/benchmark_baseline.json)')
+    parser.add_argument('--update-baseline', action='store_true', help='Store the results as the new baseline')
+    parser.add_argument('--threshold', type=float, default=0.5,
+                        help='Allowed increase of p95 latency and peak memory over the baseline (default: 0.5 = 50%%)')
+    parser.add_argument('--min-delta-ms', type=float, default=5,
+                        help='Latency increases below this many milliseconds are never regressions (default: 5)')
+    parser.add_argument('--min-delta-kb', type=int, default=1024,
+                        help='Memory increases below this many KB are never regressions (default: 1024)')
+    args = parser.parse_args()
+
+    os.makedirs(args.db_dir, exist_ok=True)
+    sizes = [int(size) for size in args.sizes.split(',')]
+    results = {str(size): benchmark_size(args, size) for size in sizes}
+
+    if args.update_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        baseline['recorded'] = {
+            'date': datetime.now().strftime('%Y-%m-%d'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+        }
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, ensure_ascii=False)
+            f.write('\n')
+        print(f"\nStored the results as the baseline in {args.baseline}.")
+        return True
+
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}; run with --update-baseline to store one.")
+        return True
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+
+    found = regressions(results, baseline, args.threshold, args.min_delta_ms, args.min_delta_kb)
+    print()
+    for message in found:
+        print(f"REGRESSION {message}")
+    print(f"{len(found)} regressions against {args.baseline} (threshold {args.threshold:.0%}).")
+    return not found
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
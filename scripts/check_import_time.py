@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Script to check that importing the application stays within a time budget.
+Every gunicorn worker imports app.py on boot, so this measures the import in fresh
+Python processes and exits with status 1 if the median exceeds the budget, or if
+importing the app loads a module that should only be loaded on demand (pandas).
+
+    python scripts/check_import_time.py --budget 0.8 --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that must not be loaded by importing the app
+LAZY_MODULES = ['pandas', 'numpy', 'openpyxl', 'folium']
+
+MEASURE = f'''
+import json, sys, time
+start = time.perf_counter()
+import app
+elapsed = time.perf_counter() - start
+print(json.dumps({{'seconds': elapsed, 'loaded': [m for m in {LAZY_MODULES!r} if m in sys.modules]}}))
+'''
+
+def measure_import():
+    """Import the app in a fresh interpreter, returns (seconds, lazy modules that were loaded)"""
+    result = subprocess.run([sys.executable, '-c', MEASURE], cwd=ROOT, capture_output=True, text=True, check=True)
+    measurement = json.loads(result.stdout.strip().splitlines()[-1])
+    return measurement['seconds'], measurement['loaded']
+
+def main():
+    parser = argparse.ArgumentParser(description='Check the import time of app.py against a budget')
+    parser.add_argument('--budget', type=float, default=float(os.environ.get('IMPORT_TIME_BUDGET', 1.0)),
+                        help='Maximum median import time in seconds (default: 1.0 or IMPORT_TIME_BUDGET)')
+    parser.add_argument('--runs', type=int, default=5, help='Number of fresh imports to measure (default: 5)')
+    args = parser.parse_args()
+
+    timings = []
+    loaded = set()
+    for _ in range(args.runs):
+        seconds, modules = measure_import()
+        timings.append(seconds)
+        loaded.update(modules)
+
+    median = statistics.median(timings)
+    print(f"Import of app.py: median {median:.3f}s, min {min(timings):.3f}s, max {max(timings):.3f}s "
+          f"over {args.runs} runs (budget {args.budget:.3f}s)")
+
+    ok = True
+    if median > args.budget:
+        print(f"FAIL: median import time is over the budget by {median - args.budget:.3f}s")
+        ok = False
+    if loaded:
+        print(f"FAIL: importing the app loads {', '.join(sorted(loaded))}, which should only be imported on demand")
+        ok = False
+    if ok:
+        print("OK")
+    return ok
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Script to check that the hot queries of the application use an index.
+Runs EXPLAIN QUERY PLAN for each query on the configured SQLite database and
+exits with status 1 if a query doesn't use one of the expected indexes.
+Run scripts/migrate_db.py first, so the indexes exist.
+"""
+import sys
+import os
+
+# Add parent directory to path so we can import from app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, db, RecurringDonor, DonorDailyRollup, CountyMapping
+from geo_aggregation import donors_per_area_query
+from sqlalchemy import select, func, text, TextClause
+from datetime import datetime, timedelta
+
+def hot_queries():
+    """The hot queries, each with the indexes it may use"""
+    today = datetime.now().date()
+    return [
+        ("Vendor upsert by name_id",
+         select(RecurringDonor).where(RecurringDonor.name_id == 12345678),
+         ['uq_recurring_donor_import_key']),
+        ("Excel import keys by name_id",
+         select(RecurringDonor.id, RecurringDonor.agreement_number, RecurringDonor.name_id)
+         .where(RecurringDonor.name_id.in_([1, 2, 3]), RecurringDonor.agreement_number.isnot(None)),
+         ['uq_recurring_donor_import_key']),
+        ("Excel import identity",
+         select(RecurringDonor.id)
+         .where(RecurringDonor.name_id == 12345678, RecurringDonor.agreement_number == '1001'),
+         ['uq_recurring_donor_import_key']),
+        ("New donors by start date",
+         select(RecurringDonor.start_date, func.count())
+         .where(RecurringDonor.start_date.between(today - timedelta(days=36), today))
+         .group_by(RecurringDonor.start_date),
+         ['ix_recurring_donor_start_date']),
+        ("Donors per project (/region)",
+         text("SELECT prosjektnavn, COUNT(*), SUM(belop) FROM recurring_donor "
+              "WHERE prosjektnavn IS NOT NULL AND prosjektnavn != '' GROUP BY prosjektnavn"),
+         ['ix_recurring_donor_prosjektnavn']),
+        ("Donors per county (/kart)",
+         donors_per_area_query(RecurringDonor.__table__, CountyMapping.__table__, 'fylke'),
+         ['ix_recurring_donor_fylke']),
+        ("Daily rollup by date",
+         select(DonorDailyRollup).where(DonorDailyRollup.date >= today - timedelta(days=36)),
+         ['ix_donor_daily_rollup_key']),
+    ]
+
+def query_plan(conn, statement):
+    """Return the EXPLAIN QUERY PLAN lines of a statement"""
+    if not isinstance(statement, TextClause):
+        statement = text(str(statement.compile(db.engine, compile_kwargs={'literal_binds': True})))
+    return [row[-1] for row in conn.execute(text(f'EXPLAIN QUERY PLAN {statement.text}'))]
+
+def check_query_plans():
+    failures = 0
+    with app.app_context():
+        if db.engine.dialect.name != 'sqlite':
+            print(f"Query plan checks are only implemented for SQLite, not {db.engine.dialect.name}.")
+            return True
+
+        with db.engine.connect() as conn:
+            for name, statement, index_names in hot_queries():
+                plan = query_plan(conn, statement)
+                uses_index = any(index_name in line for line in plan for index_name in index_names)
+                print(f"{'OK  ' if uses_index else 'FAIL'} {name} (expects {' or '.join(index_names)})")
+                for line in plan:
+                    print(f"       {line}")
+                if not uses_index:
+                    failures += 1
+
+    print(f"{failures} of {len(hot_queries())} queries do not use their index.")
+    return failures == 0
+
+if __name__ == "__main__":
+    sys.exit(0 if check_query_plans() else 1)
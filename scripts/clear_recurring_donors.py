@@ -9,12 +9,15 @@ import os
 # Add parent directory to path so we can import from app
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from app import app, db, RecurringDonor
+from app import app, db, RecurringDonor, init_db, rebuild_donor_rollup
 
 with app.app_context():
+    init_db()
+    
     # Delete all records from the recurring_donor table
     num_deleted = db.session.query(RecurringDonor).delete()
     db.session.commit()
+    rebuild_donor_rollup()
     print(f"Cleared {num_deleted} records from the recurring_donor table.")
     
     # Verify the table is empty
@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""
+Script to generate realistic synthetic recurring donors for load testing.
+Rows are generated in parallel worker processes with the fields of the donor Excel
+export (fylke, prosjektnavn, produkttype, betalingsmåte, beløp, ...), and either
+bulk-loaded into the database the way an Excel import stores them, or written to an
+.xlsx fixture for import benchmarks.
+
+    python scripts/generate_donors.py --rows 1000000 --clear
+    python scripts/generate_donors.py --rows 100000 --xlsx fixtures/donors_100k.xlsx
+
+The same --seed gives the same rows, whatever the number of workers. openpyxl writes
+.xlsx files several times faster when lxml is installed.
+"""
+import sys
+import os
+import argparse
+import random
+import time
+from datetime import date, datetime, timedelta
+from multiprocessing import Pool
+
+# Add parent directory to path so we can import from app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, db, RecurringDonor, init_db, rebuild_donor_rollup
+from excel_import import ALLOWED_COLUMNS, IMPORTED_PRODUCT_TYPES
+from sqlalchemy import insert, select, func
+
+# Places donors live in: (fylke, kommune, poststed, first postnummer) with a weight.
+# Older agreements carry the county names from before 2020, which /kart maps to the current ones.
+PLACES = [
+    (('Oslo', 'Oslo', 'Oslo', 150), 22),
+    (('Viken', 'Bærum', 'Sandvika', 1300), 5),
+    (('Akershus', 'Asker', 'Asker', 1370), 3),
+    (('Viken', 'Fredrikstad', 'Fredrikstad', 1600), 3),
+    (('Østfold', 'Sarpsborg', 'Sarpsborg', 1700), 2),
+    (('Buskerud', 'Drammen', 'Drammen', 3000), 4),
+    (('Vestland', 'Bergen', 'Bergen', 5000), 9),
+    (('Hordaland', 'Bergen', 'Bergen', 5000), 3),
+    (('Sogn og Fjordane', 'Sunnfjord', 'Førde', 6800), 1),
+    (('Rogaland', 'Stavanger', 'Stavanger', 4000), 6),
+    (('Rogaland', 'Sandnes', 'Sandnes', 4300), 2),
+    (('Trøndelag', 'Trondheim', 'Trondheim', 7000), 8),
+    (('Agder', 'Kristiansand', 'Kristiansand S', 4600), 4),
+    (('Aust-Agder', 'Arendal', 'Arendal', 4800), 1),
+    (('Innlandet', 'Hamar', 'Hamar', 2300), 2),
+    (('Oppland', 'Lillehammer', 'Lillehammer', 2600), 1),
+    (('Hedmark', 'Elverum', 'Elverum', 2400), 1),
+    (('Vestfold og Telemark', 'Tønsberg', 'Tønsberg', 3100), 3),
+    (('Telemark', 'Skien', 'Skien', 3700), 1),
+    (('Møre og Romsdal', 'Ålesund', 'Ålesund', 6000), 3),
+    (('Nordland', 'Bodø', 'Bodø', 8000), 3),
+    (('Troms og Finnmark', 'Tromsø', 'Tromsø', 9000), 3),
+    (('Finnmark', 'Alta', 'Alta', 9500), 1),
+    ((None, None, None, None), 2),
+]
+
+# Projects (prosjektnummer, prosjektnavn) with a weight
+PROJECTS = [
+    ((1001, 'Oslo'), 30), ((1002, 'Bergen'), 14), ((1003, 'Stavanger'), 8), ((1004, 'Trondheim'), 9),
+    ((1005, 'Drammen'), 5), ((1006, 'Kristiansand'), 5), ((1007, 'Tromsø'), 4), ((1008, 'Bodø'), 3),
+    ((1009, 'Arendal'), 2), ((1000, 'Generell'), 20),
+]
+
+# Products (produkttype, produktkode, produkt) with a weight. Only MI and FG are imported,
+# the others are written to .xlsx fixtures so the import has rows to filter out.
+PRODUCTS = [
+    (('MI', 'MI01', 'Månedlig giver'), 60),
+    (('FG', 'FG01', 'Fast giver'), 30),
+    (('EG', 'EG01', 'Enkeltgave'), 6),
+    (('MB', 'MB01', 'Medlemskap'), 4),
+]
+
+PAYMENT_METHODS = [('Vipps', 50), ('Avtalegiro', 30), ('eFaktura', 10), ('SMS', 5), ('Kort', 5)]
+
+# (betalingsrytme, girorytme in months) with a weight
+PAYMENT_INTERVALS = [(('Månedlig', 1), 85), (('Kvartalsvis', 3), 10), (('Årlig', 12), 5)]
+
+AMOUNTS = [(100, 15), (150, 10), (200, 25), (250, 15), (300, 15), (400, 8), (500, 8), (1000, 4)]
+
+COUNTRIES = [(('NO', 'Norge'), 97), (('SE', 'Sverige'), 2), (('DK', 'Danmark'), 1)]
+
+CAMPAIGNS = [
+    (('VI', 'Vipps', 'Vipps-verving'), 40),
+    (('TM', 'Telemarketing', 'Telefonverving'), 25),
+    (('DM', 'Direkte markedsføring', 'Julekampanje'), 20),
+    (('FV', 'Face to face', 'Gateverving'), 15),
+]
+
+# Personal columns of the export, which the import drops; filled with placeholders
+PERSONAL_COLUMNS = ['Fornavn', 'Etternavn', 'E-post']
+
+# The export names both register columns 'Register'; the import reads the second as 'Register.1'
+EXCEL_HEADER = [column.split('.')[0] for column in ALLOWED_COLUMNS] + PERSONAL_COLUMNS
+
+# Share of agreements made by a donor who already has an agreement
+REPEAT_DONOR_SHARE = 0.05
+
+# Rows per chunk generated by a worker process
+CHUNK_SIZE = 20000
+
+def pick(rng, weighted, k):
+    """Draw k values from a list of (value, weight)"""
+    values, weights = zip(*weighted)
+    return rng.choices(values, weights=weights, k=k)
+
+def generate_chunk(task):
+    """
+    Generate the rows first_row .. first_row + size - 1 as Excel rows (a list of values
+    in EXCEL_HEADER order). The rows depend only on the seed and their position.
+    With created_at set, they are returned as RecurringDonor rows instead (see donor_rows).
+    """
+    seed, chunk_index, first_row, size, first_name_id, start, days, created_at = task
+    rng = random.Random(seed * 1000003 + chunk_index)
+
+    places = pick(rng, PLACES, size)
+    projects = pick(rng, PROJECTS, size)
+    products = pick(rng, PRODUCTS, size)
+    payment_methods = pick(rng, PAYMENT_METHODS, size)
+    intervals = pick(rng, PAYMENT_INTERVALS, size)
+    amounts = pick(rng, AMOUNTS, size)
+    countries = pick(rng, COUNTRIES, size)
+    campaigns = pick(rng, CAMPAIGNS, size)
+
+    rows = []
+    for i in range(size):
+        row_number = first_row + i
+        # Most agreements are made by new donors, some by the donor of the previous agreement
+        name_id = first_name_id + row_number
+        if row_number and rng.random() < REPEAT_DONOR_SHARE:
+            name_id -= 1
+        fylke, kommune, poststed, first_zip = places[i]
+        prosjektnummer, prosjektnavn = projects[i]
+        produkttype, produktkode, produkt = products[i]
+        betalingsrytme, girorytme = intervals[i]
+        landkode, land = countries[i]
+        aksjonstype, aksjonstype_beskrivelse, aksjonsnavn = campaigns[i]
+        belop = amounts[i]
+        start_date = start + timedelta(days=rng.randrange(days))
+        created = start_date - timedelta(days=rng.randrange(10))
+
+        rows.append([
+            name_id,                                              # Navnenr
+            'Giver',                                              # Register
+            'Fast giver',                                         # Register.1
+            str(1000000 + row_number),                            # Avtalenummer
+            f'{first_zip + rng.randrange(100):04d}' if first_zip is not None else None,  # Postnummer
+            poststed,                                             # Poststed
+            kommune,                                              # Kommune
+            fylke,                                                # Fylke
+            landkode,                                             # Landkode
+            land,                                                 # Land
+            'P' if rng.random() < 0.95 else 'B',                  # Navnetype
+            str(rng.randint(1940, 2005)),                         # Fødselsår/startår
+            produktkode,                                          # Produktkode
+            produkttype,                                          # Produkttype
+            prosjektnummer,                                       # Prosjektnummer
+            produkt,                                              # Produkt
+            prosjektnavn,                                         # Prosjektnavn
+            start_date.strftime('%d.%m.%Y'),                      # Startdato
+            payment_methods[i],                                   # Betalingsmåte
+            girorytme,                                            # Girorytme
+            betalingsrytme,                                       # Betalingsrytme
+            float(belop),                                         # Beløp
+            aksjonstype,                                          # Aksjonstype
+            aksjonstype_beskrivelse,                              # Aksjonstype beskrivelse
+            f'{start_date.year}{rng.randrange(1, 40):03d}',       # Aksjonsnummer
+            f'{aksjonsnavn} {start_date.year}',                   # Aksjonsnavn
+            'FA',                                                 # Avtaletype
+            float(belop * girorytme),                             # Periode beløp
+            created.strftime('%d.%m.%Y'),                         # Opprettet dato
+            'Giver',                                              # Fornavn
+            str(name_id),                                         # Etternavn
+            f'giver{name_id}@example.com',                        # E-post
+        ])
+    if created_at:
+        return donor_rows(rows, created_at)
+    return rows
+
+def donor_rows(rows, now):
+    """
+    Convert generated Excel rows to RecurringDonor rows the way an Excel import stores
+    them: only MI and FG, the Startdato in startdate, and the legacy fields filled in.
+    """
+    donors = []
+    for row in rows:
+        values = dict(zip(ALLOWED_COLUMNS, row))
+        if values['Produkttype'] not in IMPORTED_PRODUCT_TYPES:
+            continue
+        startdate = datetime.strptime(values['Startdato'], '%d.%m.%Y').date()
+        donors.append({
+            'created_at': now,
+            'updated_at': now,
+            'navnenr': values['Navnenr'],
+            'register': values['Register'],
+            'register_1': values['Register.1'],
+            'avtalenummer': values['Avtalenummer'],
+            'postnummer': values['Postnummer'],
+            'poststed': values['Poststed'],
+            'kommune': values['Kommune'],
+            'fylke': values['Fylke'],
+            'landkode': values['Landkode'],
+            'land': values['Land'],
+            'navnetype': values['Navnetype'],
+            'fodselsaar_startaar': values['Fødselsår/startår'],
+            'produktkode': values['Produktkode'],
+            'produkttype': values['Produkttype'],
+            'prosjektnummer': values['Prosjektnummer'],
+            'produkt': values['Produkt'],
+            'prosjektnavn': values['Prosjektnavn'],
+            'startdato': None,
+            'betalingsmaate': values['Betalingsmåte'],
+            'girorytme': values['Girorytme'],
+            'betalingsrytme': values['Betalingsrytme'],
+            'belop': values['Beløp'],
+            'aksjonstype': values['Aksjonstype'],
+            'aksjonstype_beskrivelse': values['Aksjonstype beskrivelse'],
+            'aksjonsnummer': values['Aksjonsnummer'],
+            'aksjonsnavn': values['Aksjonsnavn'],
+            'avtaletype': values['Avtaletype'],
+            'periode_belop': values['Periode beløp'],
+            'opprettet_dato': values['Opprettet dato'],
+            'name_id': values['Navnenr'],
+            'agreement_number': values['Avtalenummer'],
+            'zip_code': values['Postnummer'],
+            'country_id': values['Landkode'],
+            'nametype_id': values['Navnetype'],
+            'producttype_id': values['Produkttype'],
+            'project_id': values['Prosjektnummer'],
+            'amount': values['Beløp'],
+            'interval': values['Betalingsrytme'],
+            'startdate': startdate,
+            'payment_method': values['Betalingsmåte'],
+            'campaign_id': values['Navnenr'] % 10 + 1,
+            'classification_id_success': 'S1',
+            'start_date': startdate,
+        })
+    return donors
+
+def generate(args, first_name_id, created_at=None):
+    """
+    Yield the generated rows chunk by chunk, in order, from a pool of worker processes:
+    Excel rows, or RecurringDonor rows if created_at is given
+    """
+    days = (args.end - args.start).days + 1
+    tasks = [(args.seed, index, first_row, min(CHUNK_SIZE, args.rows - first_row), first_name_id, args.start, days,
+              created_at)
+             for index, first_row in enumerate(range(0, args.rows, CHUNK_SIZE))]
+    if args.workers <= 1:
+        yield from map(generate_chunk, tasks)
+        return
+    with Pool(args.workers) as pool:
+        yield from pool.imap(generate_chunk, tasks)
+
+def write_xlsx(args):
+    """Write the generated rows to an .xlsx fixture in the format of the donor export"""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Givere')
+    sheet.append(EXCEL_HEADER)
+    written = 0
+    for rows in generate(args, args.first_name_id or 10000000):
+        for row in rows:
+            sheet.append(row)
+        written += len(rows)
+        print(f"Generated {written} of {args.rows} rows...")
+    directory = os.path.dirname(args.xlsx)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    workbook.save(args.xlsx)
+
+def load_database(args):
+    """Bulk-load the generated donors into the database, and rebuild the daily rollup"""
+    with app.app_context():
+        init_db()
+        table = RecurringDonor.__table__
+
+        if args.clear:
+            print("Clearing existing data...")
+            db.session.query(RecurringDonor).delete()
+            db.session.commit()
+
+        # Continue after the highest name_id, so generated donors never collide with stored ones
+        first_name_id = args.first_name_id
+        if first_name_id is None:
+            max_name_id = db.session.execute(select(func.max(table.c.name_id))).scalar()
+            first_name_id = max(10000000, (max_name_id or 0) + 1)
+
+        # The workers generate and convert the next chunks while this process inserts
+        loaded = 0
+        for donors in generate(args, first_name_id, created_at=datetime.utcnow()):
+            # One executemany statement and one transaction per chunk
+            with db.engine.begin() as connection:
+                connection.execute(insert(table), donors)
+            loaded += len(donors)
+            print(f"Loaded {loaded} donors...")
+
+        print("Rebuilding the daily rollup...")
+        rebuild_donor_rollup()
+    return loaded
+
+def parse_day(value):
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+def main():
+    today = date.today()
+    parser = argparse.ArgumentParser(description='Generate synthetic recurring donors for load testing')
+    parser.add_argument('--rows', type=int, default=100000,
+                        help='Number of rows to generate; about 10%% are not MI/FG and skipped in the database (default: 100000)')
+    parser.add_argument('--xlsx', help='Write the rows to this .xlsx file instead of loading them into the database')
+    parser.add_argument('--clear', action='store_true', help='Delete all recurring donors before loading')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='Number of worker processes generating rows (default: number of CPUs)')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed (default: 1)')
+    parser.add_argument('--start', type=parse_day, default=today - timedelta(days=3 * 365),
+                        help='First start date, YYYY-MM-DD (default: three years ago)')
+    parser.add_argument('--end', type=parse_day, default=today, help='Last start date, YYYY-MM-DD (default: today)')
+    parser.add_argument('--first-name-id', type=int,
+                        help='First name_id (Navnenr) to use (default: after the highest stored name_id)')
+    args = parser.parse_args()
+
+    if args.end < args.start:
+        parser.error('--end must not be before --start')
+    # An Excel sheet holds 1048576 rows, including the header
+    if args.xlsx and args.rows > 1048575:
+        parser.error('An .xlsx sheet holds at most 1048575 rows')
+
+    start = time.time()
+    if args.xlsx:
+        write_xlsx(args)
+        print(f"Wrote {args.rows} rows to {args.xlsx} in {time.time() - start:.1f} seconds.")
+    else:
+        loaded = load_database(args)
+        elapsed = time.time() - start
+        print(f"Loaded {loaded} donors in {elapsed:.1f} seconds ({loaded / elapsed:.0f} rows/s).")
+
+if __name__ == "__main__":
+    main()
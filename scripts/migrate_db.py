@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Script to initialize a database, or migrate an existing one to the current schema.
+Run once before the application starts. init_db() only creates missing tables, so
+columns and indexes added to existing tables are applied here. Every step is safe
+to run more than once.
+"""
+import sys
+import os
+from datetime import datetime
+
+# Add parent directory to path so we can import from app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, db, RecurringDonor, DonorDailyRollup, init_db, resolve_start_date, rebuild_donor_rollup, \
+    fail_interrupted_import_jobs, normalize_agreement_number
+from sqlalchemy import inspect, select, update, delete, bindparam, func, text, or_, Index
+
+# Number of rows read and written per backfill batch
+BATCH_SIZE = 1000
+
+def add_column(table, column):
+    """Add a column to an existing table if it is missing"""
+    columns = [c['name'] for c in inspect(db.engine).get_columns(table.name)]
+    if column.name in columns:
+        print(f"Column {table.name}.{column.name} already exists.")
+        return False
+
+    column_type = column.type.compile(dialect=db.engine.dialect)
+    add = 'ADD' if db.engine.dialect.name == 'mssql' else 'ADD COLUMN'
+    with db.engine.begin() as conn:
+        conn.execute(text(f'ALTER TABLE {table.name} {add} {column.name} {column_type}'))
+    print(f"Added column {table.name}.{column.name}.")
+    return True
+
+def duplicate_keys(index):
+    """Count the groups of rows that share a value of the columns of a unique index"""
+    columns = list(index.columns)
+    duplicates = (
+        select(*columns)
+        .where(*[column.isnot(None) for column in columns])
+        .group_by(*columns)
+        .having(func.count() > 1)
+        .subquery()
+    )
+    with db.engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(duplicates)).scalar()
+
+def normalize_agreement_numbers():
+    """
+    Strip the '.0' older .xls imports stored on whole-number agreement numbers, as
+    normalize_agreement_number() does, so ('12.0', 1) and ('12', 1) are one import key
+    before the unique index is created. Of the donors that then share a key, the most
+    recently updated one is kept and the others are deleted. Returns the number of
+    donors changed or deleted.
+    """
+    table = RecurringDonor.__table__
+    with db.engine.begin() as conn:
+        stored = conn.execute(
+            select(table.c.name_id)
+            .where(table.c.agreement_number.isnot(None), table.c.name_id.isnot(None))
+            .where(or_(table.c.agreement_number.like('%.0'), table.c.avtalenummer.like('%.0')))
+            .distinct()
+        ).scalars().all()
+
+        # All donors of those name_ids, grouped by their normalized import key
+        groups = {}
+        for start in range(0, len(stored), BATCH_SIZE):
+            rows = conn.execute(
+                select(table.c.id, table.c.name_id, table.c.agreement_number, table.c.avtalenummer, table.c.updated_at)
+                .where(table.c.name_id.in_(stored[start:start + BATCH_SIZE]), table.c.agreement_number.isnot(None))
+            )
+            for row in rows:
+                groups.setdefault((row.name_id, normalize_agreement_number(row.agreement_number)), []).append(row)
+
+        deletes = []
+        updates = []
+        for (name_id, agreement_number), rows in groups.items():
+            rows.sort(key=lambda row: (row.updated_at or datetime.min, row.id), reverse=True)
+            kept = rows[0]
+            deletes.extend({'row_id': row.id} for row in rows[1:])
+            avtalenummer = normalize_agreement_number(kept.avtalenummer) if kept.avtalenummer else kept.avtalenummer
+            if (kept.agreement_number, kept.avtalenummer) != (agreement_number, avtalenummer):
+                updates.append({'row_id': kept.id, 'row_agreement_number': agreement_number,
+                                'row_avtalenummer': avtalenummer})
+
+        # Delete first, so the updated keys don't collide with an existing unique index
+        if deletes:
+            conn.execute(delete(table).where(table.c.id == bindparam('row_id')), deletes)
+        if updates:
+            conn.execute(
+                update(table)
+                .where(table.c.id == bindparam('row_id'))
+                .values(agreement_number=bindparam('row_agreement_number'),
+                        avtalenummer=bindparam('row_avtalenummer')),
+                updates
+            )
+    print(f"Normalized {len(updates)} agreement numbers, deleted {len(deletes)} duplicate donors.")
+    return len(updates) + len(deletes)
+
+def create_indexes(table):
+    """
+    Create the indexes defined on the model that are missing in the database.
+    A unique index is skipped while existing rows violate it, so they can be cleaned up first.
+    """
+    existing = [i['name'] for i in inspect(db.engine).get_indexes(table.name)]
+    for index in table.indexes:
+        if index.unique and index.name not in existing:
+            n_duplicates = duplicate_keys(index)
+            if n_duplicates:
+                columns = ', '.join(column.name for column in index.columns)
+                print(f"Skipped unique index {index.name}: {n_duplicates} values of ({columns}) occur more than once.")
+                continue
+        index.create(db.engine, checkfirst=True)
+        print(f"Index {index.name} is in place.")
+
+def drop_index(table, name, *columns):
+    """Drop an index the model no longer defines, if the database still has it"""
+    existing = [i['name'] for i in inspect(db.engine).get_indexes(table.name)]
+    if name not in existing:
+        return False
+    Index(name, *columns).drop(db.engine)
+    print(f"Dropped index {name}.")
+    return True
+
+def backfill_start_date():
+    """Populate the normalized start_date column from startdate and startdato"""
+    table = RecurringDonor.__table__
+    query = (
+        select(table.c.id, table.c.startdate, table.c.startdato)
+        .where(table.c.start_date.is_(None))
+        .where((table.c.startdate.isnot(None)) | (table.c.startdato.isnot(None)))
+        .order_by(table.c.id)
+        .limit(BATCH_SIZE)
+    )
+    statement = (
+        update(table)
+        .where(table.c.id == bindparam('row_id'))
+        .values(start_date=bindparam('row_start_date'))
+    )
+
+    last_id = 0
+    updated = 0
+    unparsed = 0
+    while True:
+        with db.engine.begin() as conn:
+            rows = conn.execute(query.where(table.c.id > last_id)).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+
+            values = []
+            for row in rows:
+                start_date = resolve_start_date(row.startdate, row.startdato)
+                if start_date:
+                    values.append({'row_id': row.id, 'row_start_date': start_date})
+                else:
+                    unparsed += 1
+            if values:
+                conn.execute(statement, values)
+                updated += len(values)
+        print(f"Backfilled start_date for {updated} records so far...")
+
+    print(f"Backfill complete: {updated} records updated, {unparsed} records without a valid start date.")
+    return updated
+
+def recreate_donor_rollup():
+    """
+    Recreate donor_daily_rollup if it predates the unique rollup_key column. The table only
+    holds derived data, so it is emptied here and rebuilt by migrate().
+    """
+    table = DonorDailyRollup.__table__
+    columns = [c['name'] for c in inspect(db.engine).get_columns(table.name)]
+    if 'rollup_key' in columns:
+        return False
+    table.drop(db.engine)
+    table.create(db.engine)
+    print(f"Recreated {table.name} with the unique rollup_key column.")
+    return True
+
+def migrate():
+    with app.app_context():
+        init_db()
+        recreate_donor_rollup()
+        table = RecurringDonor.__table__
+        add_column(table, table.c.start_date)
+        normalized = normalize_agreement_numbers()
+        create_indexes(table)
+        # uq_recurring_donor_import_key starts with name_id, so once it is in place this
+        # index only costs writes
+        if 'uq_recurring_donor_import_key' in [i['name'] for i in inspect(db.engine).get_indexes(table.name)]:
+            drop_index(table, 'ix_recurring_donor_name_id', table.c.name_id)
+        backfilled = backfill_start_date()
+
+        # The backfill and the normalization bypass the ORM events that maintain the rollup
+        if backfilled or normalized or (DonorDailyRollup.query.count() == 0 and RecurringDonor.query.count() > 0):
+            n_rows = rebuild_donor_rollup()
+            print(f"Rebuilt donor_daily_rollup with {n_rows} rows.")
+        
+        # The server is about to start, so no import can still be running
+        n_jobs = fail_interrupted_import_jobs()
+        if n_jobs:
+            print(f"Marked {n_jobs} interrupted import jobs as failed.")
+
+if __name__ == "__main__":
+    migrate()
+    print("Database migration completed successfully!")
@@ -9,7 +9,7 @@ import os
 # Add parent directory to path so we can import from app
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from app import app, db, RecurringDonor
+from app import app, db, RecurringDonor, init_db, rebuild_donor_rollup
 import random
 from datetime import datetime, timedelta
 import string
@@ -51,7 +51,6 @@ def generate_random_donor(start_date):
         'interval': random.choice(INTERVALS),
         'startdate': start_date,
         'producttype_id': random.choice(PRODUCT_TYPES),  # Only MI or FG
-        'productvariant_id': None,
         'project_id': random.randint(0, 10),
         'campaign_id': random.randint(100, 200),
         'classification_id_success': 'BG',
@@ -62,17 +61,21 @@ def generate_random_donor(start_date):
 
 def populate_db():
     with app.app_context():
+        init_db()
+        
         # Clear the table first
         print("Clearing existing data...")
         db.session.query(RecurringDonor).delete()
         db.session.commit()
+        rebuild_donor_rollup()
         
         # Start date
         start_date = datetime(2025, 1, 1)
         end_date = datetime.now()
         
-        # Track total donors added
+        # Track total donors added, and their (name_id, agreement_number), which must be unique
         total_donors = 0
+        used_keys = set()
         
         # Loop through each day
         current_date = start_date
@@ -84,6 +87,9 @@ def populate_db():
             
             for _ in range(num_records):
                 donor_data = generate_random_donor(current_date)
+                while (donor_data['name_id'], donor_data['agreement_number']) in used_keys:
+                    donor_data = generate_random_donor(current_date)
+                used_keys.add((donor_data['name_id'], donor_data['agreement_number']))
                 
                 # Create new donor record
                 donor = RecurringDonor(
@@ -94,7 +100,6 @@ def populate_db():
                     interval=donor_data['interval'],
                     startdate=donor_data['startdate'],
                     producttype_id=donor_data['producttype_id'],
-                    productvariant_id=donor_data['productvariant_id'],
                     project_id=donor_data['project_id'],
                     campaign_id=donor_data['campaign_id'],
                     classification_id_success=donor_data['classification_id_success'],
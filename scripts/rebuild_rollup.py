@@ -0,0 +1,20 @@
+#!/usr/bin/env python3
+"""
+Script to rebuild the donor_daily_rollup table from the recurring_donor table.
+The rollup is kept up to date on every donor write, so this is only needed after
+bulk changes that bypass the application, or to repair a rollup that drifted.
+"""
+import sys
+import os
+
+# Add parent directory to path so we can import from app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, db, rebuild_donor_rollup
+
+with app.app_context():
+    db.create_all()
+    n_rows = rebuild_donor_rollup()
+    print(f"Rebuilt donor_daily_rollup with {n_rows} rows.")
+
+print("Rollup rebuild completed successfully!")
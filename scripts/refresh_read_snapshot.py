@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Script to refresh the SQLite snapshot the dashboards read from.
+When DATABASE_READ_URL points to a SQLite file, the heavy dashboard reads go to that
+file instead of the primary database. This copies the primary database into it with
+the SQLite backup API, so readers of the snapshot see either the old or the new copy.
+Run it periodically, e.g. from cron every minute:
+
+    * * * * * cd /path/to/app && python scripts/refresh_read_snapshot.py
+"""
+import sys
+import os
+import sqlite3
+import time
+
+# Add parent directory to path so we can import from app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, db
+
+def sqlite_path(engine):
+    """Path of the database file of a SQLite engine, None for other databases"""
+    if engine.dialect.name != 'sqlite':
+        return None
+    return engine.url.database
+
+def refresh_read_snapshot():
+    with app.app_context():
+        if 'read' not in db.engines:
+            print("DATABASE_READ_URL is not set, nothing to refresh.")
+            return False
+
+        primary_path = sqlite_path(db.engine)
+        snapshot_path = sqlite_path(db.engines['read'])
+        if not primary_path or not snapshot_path:
+            print("Snapshots are only supported from a SQLite database to a SQLite file; "
+                  "a replica is kept up to date by the database server.")
+            return False
+
+    start = time.time()
+    primary = sqlite3.connect(primary_path)
+    snapshot = sqlite3.connect(snapshot_path, timeout=60)
+    try:
+        primary.backup(snapshot)
+    finally:
+        snapshot.close()
+        primary.close()
+    print(f"Copied {primary_path} to {snapshot_path} in {time.time() - start:.2f} seconds.")
+    return True
+
+if __name__ == "__main__":
+    sys.exit(0 if refresh_read_snapshot() else 1)
@@ -9,6 +9,10 @@ if [ -d "antenv" ]; then
     source antenv/bin/activate
 fi
 
+# Apply schema changes to the existing database
+echo "Migrating database..."
+python scripts/migrate_db.py
+
 # Start the application with gunicorn
 echo "Starting gunicorn server..."
-gunicorn --bind=0.0.0.0:8000 app:app --timeout 600
+gunicorn -c gunicorn_config.py app:app
@@ -0,0 +1,77 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+class GroupCommitQueue:
+    """
+    Coalesces single-record writes of concurrent requests into group commits.
+
+    Requests submit validated records and get a Future. One writer thread per worker
+    collects the queued records for up to max_delay seconds or max_batch records and
+    hands them to flush, which writes them in one transaction and returns a result per
+    record. If the transaction fails, the records are written one at a time, so a bad
+    record fails only its own request.
+    """
+
+    def __init__(self, flush, max_delay=0.01, max_batch=100):
+        self.flush = flush
+        self.max_delay = max_delay
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, app, record):
+        """Queue a record for the next group commit, returns a Future of its result"""
+        future = Future()
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, args=(app,), name='write-queue', daemon=True)
+                self._thread.start()
+            self._queue.put((record, future))
+        return future
+
+    def close(self, timeout=30):
+        """Write the queued records and stop the writer thread"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+            if thread is None:
+                return
+            self._queue.put(None)
+        thread.join(timeout)
+
+    def _run(self, app):
+        stopping = False
+        while not stopping:
+            entry = self._queue.get()
+            if entry is None:
+                return
+            batch = [entry]
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_batch:
+                try:
+                    # Take what is already queued, then wait for more until the deadline
+                    entry = self._queue.get(timeout=max(0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if entry is None:
+                    stopping = True
+                    break
+                batch.append(entry)
+            self._write(app, batch)
+
+    def _write(self, app, batch):
+        try:
+            with app.app_context():
+                results = self.flush([record for record, _ in batch])
+        except Exception as e:
+            if len(batch) > 1:
+                for entry in batch:
+                    self._write(app, [entry])
+                return
+            app.logger.error(f'Queued write of {batch[0][0]!r} failed: {e}')
+            batch[0][1].set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
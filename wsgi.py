@@ -13,34 +13,8 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Log system information
-logger.info(f'WSGI startup - Python version: {sys.version}')
-logger.info(f'WSGI startup - Platform: {sys.platform}')
-logger.info(f'WSGI startup - Current working directory: {os.getcwd()}')
-logger.info(f'WSGI startup - Environment variables: {[k for k in os.environ.keys()]}')
-logger.info(f'WSGI startup - Python path: {sys.path}')
-
-# Check if we're running in Azure
-is_azure = 'WEBSITE_SITE_NAME' in os.environ
-logger.info(f'Running in Azure: {is_azure}')
-
-# Check for critical directories
-instance_path = os.path.join(os.getcwd(), 'instance')
-logger.info(f'Instance path: {instance_path}')
-if os.path.exists(instance_path):
-    logger.info(f'Instance directory exists')
-    if os.access(instance_path, os.W_OK):
-        logger.info(f'Instance directory is writable')
-    else:
-        logger.error(f'Instance directory is not writable')
-else:
-    logger.info(f'Instance directory does not exist')
-    try:
-        os.makedirs(instance_path, exist_ok=True)
-        logger.info(f'Created instance directory')
-    except Exception as e:
-        logger.error(f'Failed to create instance directory: {e}')
-
+# Startup checks and table creation run once in scripts/migrate_db.py before the
+# workers start, so importing the app stays cheap for every worker
 try:
     logger.info("Attempting to import app...")
     from app import app